@@ -35,10 +35,11 @@ def run_ohlcv_example():
     
     print(f"Successfully loaded {record_count} records")
     
-    # Generate OHLCV data with 5min timeframe
+    # Generate 5min OHLCV for the summary and 7min for the chart in one pass
     timeframe = '5min'
     print(f"\nGenerating OHLCV with {timeframe} timeframe...")
-    ohlcv_data = ohlcv_agg.generate_ohlcv(timeframe)
+    ohlcv_by_timeframe = ohlcv_agg.generate_ohlcv_multi([timeframe, '7min'])
+    ohlcv_data = ohlcv_by_timeframe[timeframe]
     
     if ohlcv_data:
         print(f"Generated {len(ohlcv_data)} OHLCV periods")
@@ -65,6 +66,12 @@ def run_ohlcv_example():
         print(f"  Total volume: {total_volume:.2f}")
         print(f"  Average volume per period: {avg_volume:.2f}")
         print(f"  Price change: ${price_change:.2f} ({price_change_pct:.2f}%)")
+        
+        # Streaming mode emits candles as their period closes instead of storing ticks
+        stream_agg = OHLCVAggregator("BTCUSDT", stream_timeframes=[timeframe])
+        streamed = stream_agg.add_tick_array(ohlcv_agg.ticks.sorted_array())[timeframe]
+        streamed += list(stream_agg.flush().values())
+        print(f"  Streamed {len(streamed)} candles")
     else:
         print("No OHLCV data generated")
     
@@ -74,8 +81,8 @@ def run_ohlcv_example():
     try:
         from visualization.ohlcv_visualization import plot_ohlcv
         print("\nCreating OHLCV visualization...")
-        # Use 5min data for visualization
-        ohlcv_data = ohlcv_agg.generate_ohlcv('7min')
+        # Use 7min data for visualization
+        ohlcv_data = ohlcv_by_timeframe['7min']
         if ohlcv_data:
             plot_ohlcv(ohlcv_data, "BTCUSDT OHLCV Analysis")
     except ImportError:
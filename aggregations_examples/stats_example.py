@@ -68,6 +68,14 @@ def run_stats_example():
         print(f"  Large Buy Volume: ${large_orders.get('large_buy_volume', 0):,.2f}")
         print(f"  Large Sell Volume: ${large_orders.get('large_sell_volume', 0):,.2f}")
         
+        # Percentiles
+        print(f"\nTrade Size Percentiles:")
+        for label, value in stats.get('trade_size_percentiles', {}).items():
+            print(f"  {label}: ${value:,.2f}")
+        print(f"\nInter-Trade Time Percentiles:")
+        for label, value in stats.get('inter_trade_time_percentiles', {}).items():
+            print(f"  {label}: {value:.3f}s")
+        
         # Simple visualization
         try:
             from visualization.stats_visualization import plot_summary_stats
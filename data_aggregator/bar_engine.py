@@ -0,0 +1,158 @@
+"""
+Bar Engine - one pass over the tick columns for OHLCV, VWAP and buy/sell volume per period
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+from data_aggregator.timeframes import timeframe_to_ns, resample_origin_ns, period_start_ns, period_bounds
+from exchange.models import SIDE_BUY, SIDE_SELL
+
+# Columns summed when bars are built or rolled up
+SUM_COLUMNS = ['volume', 'size', 'buy_volume', 'sell_volume', 'buy_size', 'sell_size',
+               'trade_count', 'buy_count', 'sell_count']
+
+def segment_sums(columns: Dict[str, np.ndarray], starts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Sum each column over the segments beginning at starts.
+
+    Float columns go through pandas groupby sum, which uses Kahan summation
+    in row order - the same as OHLCVStream - so bars match a streamed
+    replay bit for bit. Integer columns use np.add.reduceat.
+    """
+    lengths = np.diff(np.append(starts, len(next(iter(columns.values())))))
+    codes = np.repeat(np.arange(len(starts)), lengths)
+    floats = {name: column for name, column in columns.items() if column.dtype.kind == 'f'}
+    sums = {name: np.add.reduceat(column, starts) for name, column in columns.items() if name not in floats}
+    if floats:
+        grouped = pd.DataFrame(floats).groupby(codes, sort=False).sum()
+        sums.update({name: grouped[name].to_numpy() for name in floats})
+    return sums
+
+class TimeBars:
+    """Per-period bar columns shared by the OHLCV, VWAP and delta aggregators.
+
+    Periods follow pandas resample bucketing and empty periods are skipped
+    (like resample().dropna()). volume is USD (size * price) and size is the
+    base-asset amount, so vwap = volume / size is weighted by base size.
+
+    Calendar timeframes such as '1W' or 'M' are binned by resample itself;
+    roll_up and the streaming classes need fixed timeframes.
+    """
+
+    def __init__(self, ticks: np.ndarray, timeframe, origin_ns: Optional[int] = None):
+        """Build bars from a TICK_DTYPE array that is already in timestamp order.
+
+        origin_ns overrides the bucket origin (midnight of the first tick) so
+        bars built from separate partitions line up. It is ignored for
+        calendar timeframes, whose bins are already anchored to the calendar.
+        """
+        if len(ticks) == 0:
+            raise ValueError("No tick data available")
+        self.timeframe = timeframe
+
+        timestamps, prices, sizes = ticks['timestamp'], ticks['price'], ticks['size']
+        is_buy, is_sell = ticks['side'] == SIDE_BUY, ticks['side'] == SIDE_SELL
+        volumes = sizes * prices
+
+        starts, labels = period_bounds(timestamps, timeframe, origin_ns)
+        ends = np.append(starts[1:], len(ticks)) - 1
+
+        self.starts = starts  # first tick index of each bar
+        self.timestamps = labels
+        self.first_timestamps = timestamps[starts]
+        self.open = prices[starts]
+        self.high = np.maximum.reduceat(prices, starts)
+        self.low = np.minimum.reduceat(prices, starts)
+        self.close = prices[ends]
+
+        columns = {
+            'volume': volumes,
+            'size': sizes,
+            'buy_volume': np.where(is_buy, volumes, 0.0),
+            'sell_volume': np.where(is_sell, volumes, 0.0),
+            'buy_size': np.where(is_buy, sizes, 0.0),
+            'sell_size': np.where(is_sell, sizes, 0.0),
+            'trade_count': np.ones(len(ticks), dtype=np.int64),
+            'buy_count': is_buy.astype(np.int64),
+            'sell_count': is_sell.astype(np.int64),
+        }
+        for name, column in segment_sums(columns, starts).items():
+            setattr(self, name, column)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    @property
+    def vwap(self) -> np.ndarray:
+        """Size-weighted average price of each bar"""
+        return self.volume / self.size
+
+    @property
+    def delta(self) -> np.ndarray:
+        """Buy minus sell base size"""
+        return self.buy_size - self.sell_size
+
+    def roll_up(self, timeframe) -> 'TimeBars':
+        """Combine these bars into a coarser timeframe that is a multiple of this one"""
+        period_ns = timeframe_to_ns(timeframe)
+        labels = period_start_ns(self.timestamps, period_ns, resample_origin_ns(int(self.timestamps[0])))
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+        ends = np.append(starts[1:], len(self)) - 1
+
+        bars = TimeBars.__new__(TimeBars)
+        bars.timeframe = timeframe
+        bars.starts = self.starts[starts]
+        bars.timestamps = labels[starts]
+        bars.first_timestamps = self.first_timestamps[starts]
+        bars.open = self.open[starts]
+        bars.high = np.maximum.reduceat(self.high, starts)
+        bars.low = np.minimum.reduceat(self.low, starts)
+        bars.close = self.close[ends]
+        for name, column in segment_sums({name: getattr(self, name) for name in SUM_COLUMNS}, starts).items():
+            setattr(bars, name, column)
+        return bars
+
+    @classmethod
+    def concatenate(cls, parts: List['TimeBars']) -> 'TimeBars':
+        """Merge bars built from consecutive partitions with the same origin.
+
+        Periods split across partitions are combined; starts is not kept.
+        """
+        parts = [part for part in parts if part is not None and len(part)]
+        if not parts:
+            raise ValueError("No bars to concatenate")
+        columns = {name: np.concatenate([getattr(part, name) for part in parts])
+                   for name in ['timestamps', 'first_timestamps', 'open', 'high', 'low', 'close'] + SUM_COLUMNS}
+
+        # Stable sort keeps partition order inside a period, so open/close stay first/last
+        order = np.argsort(columns['timestamps'], kind='stable')
+        columns = {name: column[order] for name, column in columns.items()}
+        labels = columns['timestamps']
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+        ends = np.append(starts[1:], len(labels)) - 1
+
+        bars = cls.__new__(cls)
+        bars.timeframe = parts[0].timeframe
+        bars.starts = None
+        bars.timestamps = labels[starts]
+        bars.first_timestamps = np.minimum.reduceat(columns['first_timestamps'], starts)
+        bars.open = columns['open'][starts]
+        bars.high = np.maximum.reduceat(columns['high'], starts)
+        bars.low = np.minimum.reduceat(columns['low'], starts)
+        bars.close = columns['close'][ends]
+        for name, column in segment_sums({name: columns[name] for name in SUM_COLUMNS}, starts).items():
+            setattr(bars, name, column)
+        return bars
+
+    def to_frame(self) -> pd.DataFrame:
+        """All bar columns plus vwap and delta, indexed by period start"""
+        frame = pd.DataFrame({
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            **{name: getattr(self, name) for name in SUM_COLUMNS},
+            'vwap': self.vwap,
+            'delta': self.delta,
+        }, index=pd.DatetimeIndex(self.timestamps.astype('datetime64[ns]'), name='timestamp'))
+        return frame
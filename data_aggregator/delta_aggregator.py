@@ -2,85 +2,221 @@
 Delta Aggregator - Tracks basic delta (ask - bid) over time
 """
 
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
-from exchange.models import TickData
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass
+from exchange.models import TickData, SIDE_BUY, SIDE_SELL
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.bar_engine import TimeBars
+from data_aggregator.timeframes import timeframe_to_ns, resample_origin_ns, period_start_ns
+
+@dataclass
+class DeltaBar:
+    """Delta of one period, in base-asset size.
+
+    delta_open/high/low track the running cumulative delta inside the bar
+    (delta_open is the cumulative delta before the first tick, the close is
+    cumulative_delta). divergence marks bars whose price move and delta
+    have opposite signs.
+    """
+    timestamp: datetime
+    open_price: float
+    close_price: float
+    delta: float
+    cumulative_delta: float
+    delta_open: float
+    delta_high: float
+    delta_low: float
+    buy_size: float
+    sell_size: float
+    buy_count: int
+    sell_count: int
+    divergence: bool
+
+class DeltaStream:
+    """Incremental delta bars for one timeframe, keeping only the open bar.
+
+    Buckets follow pandas resample like OHLCVStream; ticks older than the
+    open bar are folded into it. Cumulative delta carries across bars.
+    """
+
+    def __init__(self, timeframe: str):
+        self.timeframe = timeframe
+        self.period_ns = timeframe_to_ns(timeframe)
+        self.cumulative_delta = 0.0
+        self._origin_ns: Optional[int] = None
+        self._start_ns: Optional[int] = None
+
+    def update(self, timestamp_ns: int, price: float, size: float, side: int) -> Optional[DeltaBar]:
+        """Add one tick (base-asset size, side code); returns the completed bar when the period rolls over"""
+        if self._origin_ns is None:
+            self._origin_ns = resample_origin_ns(timestamp_ns)
+        start_ns = period_start_ns(timestamp_ns, self.period_ns, self._origin_ns)
+
+        completed = None
+        if self._start_ns is None or start_ns > self._start_ns:
+            completed = self.flush()
+            self._start_ns = start_ns
+            self._open_price = price
+            self._delta_open = self._delta_high = self._delta_low = self.cumulative_delta
+            self._buy_size = self._sell_size = 0.0
+            self._buy_count = self._sell_count = 0
+
+        self._close_price = price
+        if side == SIDE_BUY:
+            self._buy_size += size
+            self._buy_count += 1
+            self.cumulative_delta += size
+            self._delta_high = max(self._delta_high, self.cumulative_delta)
+        elif side == SIDE_SELL:
+            self._sell_size += size
+            self._sell_count += 1
+            self.cumulative_delta -= size
+            self._delta_low = min(self._delta_low, self.cumulative_delta)
+        return completed
+
+    def flush(self) -> Optional[DeltaBar]:
+        """Close and return the open bar, if any"""
+        if self._start_ns is None:
+            return None
+        delta = self._buy_size - self._sell_size
+        bar = DeltaBar(
+            timestamp=pd.Timestamp(self._start_ns),
+            open_price=self._open_price,
+            close_price=self._close_price,
+            delta=delta,
+            cumulative_delta=self.cumulative_delta,
+            delta_open=self._delta_open,
+            delta_high=self._delta_high,
+            delta_low=self._delta_low,
+            buy_size=self._buy_size,
+            sell_size=self._sell_size,
+            buy_count=self._buy_count,
+            sell_count=self._sell_count,
+            divergence=(self._close_price - self._open_price) * delta < 0
+        )
+        self._start_ns = None
+        return bar
 
 class DeltaAggregator:
-    """Aggregates tick data to track basic delta (buying vs selling pressure) over time."""
-    
-    def __init__(self, symbol: str = "XBTUSD"):
+    """Aggregates tick data to track basic delta (buying vs selling pressure) over time.
+
+    With stream_timeframes set, ticks are not stored: each add_* call updates
+    one open DeltaBar per timeframe and returns the bars that completed.
+    """
+
+    def __init__(self, symbol: str = "XBTUSD", tick_buffer: Optional[TickBuffer] = None,
+                 stream_timeframes: Optional[List[str]] = None):
         self.symbol = symbol
-        self.ticks: List[TickData] = []
-    
-    def add_tick(self, tick: TickData):
-        self.ticks.append(tick)
-    
-    def add_ticks(self, ticks: List[TickData]):
-        self.ticks.extend(ticks)
-    
-    def _prepare_dataframe(self) -> pd.DataFrame:
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        self.streams = {tf: DeltaStream(tf) for tf in stream_timeframes or []}
+
+    def add_tick(self, tick: TickData) -> Dict[str, DeltaBar]:
+        if not self.streams:
+            self.ticks.append(tick)
+            return {}
+        return self._update_streams(tick.timestamp_ns, tick.price, tick.size, tick.side_code)
+
+    def add_ticks(self, ticks: List[TickData]) -> Dict[str, List[DeltaBar]]:
+        if not self.streams:
+            self.ticks.extend(ticks)
+            return {}
+        completed = {tf: [] for tf in self.streams}
+        for tick in ticks:
+            for tf, bar in self.add_tick(tick).items():
+                completed[tf].append(bar)
+        return completed
+
+    def add_tick_array(self, ticks: np.ndarray) -> Dict[str, List[DeltaBar]]:
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if not self.streams:
+            self.ticks.extend(ticks)
+            return {}
+        completed = {tf: [] for tf in self.streams}
+        for row in zip(ticks['timestamp'].tolist(), ticks['price'].tolist(), ticks['size'].tolist(), ticks['side'].tolist()):
+            for tf, bar in self._update_streams(*row).items():
+                completed[tf].append(bar)
+        return completed
+
+    def _update_streams(self, timestamp_ns: int, price: float, size: float, side: int) -> Dict[str, DeltaBar]:
+        completed = {}
+        for tf, stream in self.streams.items():
+            bar = stream.update(timestamp_ns, price, size, side)
+            if bar is not None:
+                completed[tf] = bar
+        return completed
+
+    def flush(self) -> Dict[str, DeltaBar]:
+        """Close the open streaming bars"""
+        open_bars = {tf: stream.flush() for tf, stream in self.streams.items()}
+        return {tf: bar for tf, bar in open_bars.items() if bar is not None}
+
+    def generate_delta_arrays(self, timeframe: str) -> Dict[str, np.ndarray]:
+        """Generate delta bars as columns keyed by DeltaBar field name"""
         if not self.ticks:
-            return pd.DataFrame()
-        
-        data = []
-        for tick in self.ticks:
-            # Calculate delta: positive for buys, negative for sells
-            delta = tick.size if tick.side.lower() == 'buy' else -tick.size
-            data.append({
-                'timestamp': tick.timestamp,
-                'price': tick.price,
-                'size': tick.size,
-                'side': tick.side,
-                'delta': delta
-            })
-        
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp').sort_index()
-        return df
-
-    def _calculate_delta_for_period(self, period_df: pd.DataFrame) -> Dict[str, Any]:
-        """Calculates basic delta for a given time period."""
-        if period_df.empty:
             return {}
 
-        # Calculate basic delta
-        total_delta = period_df['delta'].sum()
-        
+        ticks = self.ticks.sorted_array()
+        bars = TimeBars(ticks, timeframe)
+
+        # Running cumulative delta per tick; unknown-side ticks add 0
+        signed = np.where(ticks['side'] == SIDE_BUY, ticks['size'], 0.0) - np.where(ticks['side'] == SIDE_SELL, ticks['size'], 0.0)
+        running = np.cumsum(signed)
+        delta_open = running[bars.starts] - signed[bars.starts]
+        ends = np.append(bars.starts[1:], len(ticks)) - 1
+        delta = bars.delta
+
         return {
-            'timestamp': period_df.index.min(),
-            'delta': total_delta
+            'timestamp': bars.timestamps.astype('datetime64[ns]'),
+            'open_price': bars.open,
+            'close_price': bars.close,
+            'delta': delta,
+            'cumulative_delta': running[ends],
+            'delta_open': delta_open,
+            'delta_high': np.maximum(np.maximum.reduceat(running, bars.starts), delta_open),
+            'delta_low': np.minimum(np.minimum.reduceat(running, bars.starts), delta_open),
+            'buy_size': bars.buy_size,
+            'sell_size': bars.sell_size,
+            'buy_count': bars.buy_count,
+            'sell_count': bars.sell_count,
+            'divergence': (bars.close - bars.open) * delta < 0
         }
 
+    def generate_delta_bars(self, timeframe: str) -> List[DeltaBar]:
+        """Generate delta bars as DeltaBar objects"""
+        columns = self.generate_delta_arrays(timeframe)
+        if not columns:
+            return []
+
+        timestamps = pd.DatetimeIndex(columns.pop('timestamp'))
+        values = {name: column.tolist() for name, column in columns.items()}
+        return [
+            DeltaBar(timestamp=timestamp, **{name: column[i] for name, column in values.items()})
+            for i, timestamp in enumerate(timestamps)
+        ]
+
     def generate_delta_by_timeframe(self, timeframe: str) -> List[Dict[str, Any]]:
         """
         Generates basic delta for specified timeframes.
-        
+
         Args:
             timeframe (str): A pandas-compatible frequency string (e.g., '1H', '30min', '1D').
-            
+
         Returns:
-            A list of delta dictionaries with timestamp and delta value.
+            A list of delta dictionaries with the first tick timestamp of each
+            period and its delta (buy minus sell base size).
         """
         if not self.ticks:
             return []
-            
-        df = self._prepare_dataframe()
-        if df.empty:
-            return []
-            
-        # Use pandas resample to group data by clock-based timeframes
-        resampled_groups = df.resample(timeframe)
-        
-        all_deltas = []
-        for period_timestamp, period_df in resampled_groups:
-            if not period_df.empty:
-                delta_metrics = self._calculate_delta_for_period(period_df)
-                if delta_metrics:
-                    all_deltas.append(delta_metrics)
-                    
-        return all_deltas
+
+        bars = TimeBars(self.ticks.sorted_array(), timeframe)
+        return [
+            {'timestamp': pd.Timestamp(timestamp), 'delta': delta}
+            for timestamp, delta in zip(bars.first_timestamps.tolist(), bars.delta.tolist())
+        ]
 
     def clear_data(self):
-        self.ticks.clear()
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer()
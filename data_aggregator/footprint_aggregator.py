@@ -3,9 +3,11 @@ Footprint Chart data aggregator - Supports both Time-based and corrected Range-b
 """
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, field
-from exchange.models import TickData
+from exchange.models import TickData, SIDE_BUY, SIDE_SELL
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.price_histogram import TimePriceHistogram
 import numpy as np
 
 @dataclass
@@ -14,8 +16,9 @@ class FootprintRow:
     bid_volume: float = 0.0
     ask_volume: float = 0.0
 
-@dataclass
+@dataclass(eq=False)
 class FootprintCandle:
+    """Footprint candle stored as bid/ask volume arrays over contiguous price bins starting at base_price."""
     timestamp: datetime
     open: float
     high: float
@@ -23,93 +26,156 @@ class FootprintCandle:
     close: float
     total_volume: float
     delta: float
-    footprint_data: List[FootprintRow] = field(default_factory=list)
+    base_price: float = 0.0
+    bin_size: float = 1.0
+    bid_volumes: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    ask_volumes: np.ndarray = field(default_factory=lambda: np.zeros(0))
 
-class FootprintAggregator:
-    def __init__(self, symbol: str = "XBTUSD", price_bin_size: float = 1.0):
-        self.symbol = symbol
+    @property
+    def prices(self) -> np.ndarray:
+        return np.round(self.base_price + np.arange(len(self.bid_volumes)) * self.bin_size, 8)
+
+    @property
+    def footprint_data(self) -> List[FootprintRow]:
+        """FootprintRow view of the arrays, built on access"""
+        return [FootprintRow(price=price, bid_volume=bid, ask_volume=ask)
+                for price, bid, ask in zip(self.prices.tolist(), self.bid_volumes.tolist(), self.ask_volumes.tolist())]
+
+class RangeFootprintStream:
+    """Builds range footprint candles tick by tick.
+
+    Tracks the open candle's min/max price bin and per-bin bid/ask volume, so each
+    tick costs O(1). A tick that would make the candle span more than range_levels
+    bins closes it and opens the next candle.
+    """
+    def __init__(self, range_levels: int, price_bin_size: float = 1.0):
+        if range_levels <= 1:
+            raise ValueError("range_levels must be greater than 1")
+        self.range_levels = range_levels
         self.price_bin_size = price_bin_size
-        self.ticks: List[TickData] = []
-
-    def add_tick(self, tick: TickData):
-        self.ticks.append(tick)
-
-    def _process_ticks_into_candle(self, ticks_for_candle: List[TickData]) -> FootprintCandle:
-        if not ticks_for_candle: return None
-        period_df = pd.DataFrame([{'price': t.price, 'volume': t.size * t.price, 'side': t.side.lower()} for t in ticks_for_candle])
-        open_price, high_price, low_price, close_price = period_df['price'].iloc[0], period_df['price'].max(), period_df['price'].min(), period_df['price'].iloc[-1]
-        
-        period_df['price_bin'] = (period_df['price'] // self.price_bin_size) * self.price_bin_size
-        price_groups = period_df.groupby('price_bin')
-        footprint_rows_dict: Dict[float, FootprintRow] = {}
-        for price_bin, group in price_groups:
-            ask_volume = group[group['side'] == 'buy']['volume'].sum()
-            bid_volume = group[group['side'] == 'sell']['volume'].sum()
-            footprint_rows_dict[price_bin] = FootprintRow(price=price_bin, bid_volume=bid_volume, ask_volume=ask_volume)
-
-        binned_low = (low_price // self.price_bin_size) * self.price_bin_size
-        binned_high = (high_price // self.price_bin_size) * self.price_bin_size
-        all_expected_bins = np.arange(binned_low, binned_high + self.price_bin_size, self.price_bin_size)
-        
-        complete_footprint_data = []
-        for price_level in all_expected_bins:
-            price_level = round(price_level, 8)
-            complete_footprint_data.append(footprint_rows_dict.get(price_level, FootprintRow(price=price_level)))
-
-        sorted_footprint_data = sorted(complete_footprint_data, key=lambda r: r.price)
-        total_ask_volume = sum(row.ask_volume for row in sorted_footprint_data)
-        total_bid_volume = sum(row.bid_volume for row in sorted_footprint_data)
-        
-        return FootprintCandle(
-            timestamp=ticks_for_candle[-1].timestamp, open=open_price, high=high_price, low=low_price, close=close_price,
+        self._reset()
+
+    def _reset(self):
+        self._timestamp_ns = None
+        self._open = self._high = self._low = self._close = 0.0
+        self._min_bin = self._max_bin = 0
+        self._bid_volume: Dict[int, float] = {}
+        self._ask_volume: Dict[int, float] = {}
+
+    def update(self, timestamp_ns: int, price: float, volume: float, side: int) -> Optional[FootprintCandle]:
+        """Add one tick (USD volume, side code); returns the candle it closed, if any"""
+        price_bin = int(price // self.price_bin_size)
+        closed = None
+        if self._timestamp_ns is not None:
+            low_bin, high_bin = min(self._min_bin, price_bin), max(self._max_bin, price_bin)
+            if high_bin - low_bin + 1 > self.range_levels:
+                closed = self.flush()
+            else:
+                self._min_bin, self._max_bin = low_bin, high_bin
+                self._high, self._low = max(self._high, price), min(self._low, price)
+        if self._timestamp_ns is None:
+            self._open = self._high = self._low = price
+            self._min_bin = self._max_bin = price_bin
+        self._close = price
+        self._timestamp_ns = timestamp_ns
+
+        if side == SIDE_BUY:
+            self._ask_volume[price_bin] = self._ask_volume.get(price_bin, 0.0) + volume
+        elif side == SIDE_SELL:
+            self._bid_volume[price_bin] = self._bid_volume.get(price_bin, 0.0) + volume
+        return closed
+
+    def flush(self) -> Optional[FootprintCandle]:
+        """Close and return the open candle, if any"""
+        if self._timestamp_ns is None: return None
+        bid_volumes, ask_volumes = np.zeros(self._max_bin - self._min_bin + 1), np.zeros(self._max_bin - self._min_bin + 1)
+        for price_bin, volume in self._bid_volume.items(): bid_volumes[price_bin - self._min_bin] = volume
+        for price_bin, volume in self._ask_volume.items(): ask_volumes[price_bin - self._min_bin] = volume
+        total_ask_volume, total_bid_volume = sum(self._ask_volume.values()), sum(self._bid_volume.values())
+        candle = FootprintCandle(
+            timestamp=pd.Timestamp(self._timestamp_ns), open=self._open, high=self._high, low=self._low, close=self._close,
             total_volume=total_ask_volume + total_bid_volume, delta=total_ask_volume - total_bid_volume,
-            footprint_data=sorted_footprint_data
+            base_price=self._min_bin * self.price_bin_size, bin_size=self.price_bin_size,
+            bid_volumes=bid_volumes, ask_volumes=ask_volumes
         )
+        self._reset()
+        return candle
 
-    def _process_df_into_candle(self, period_df: pd.DataFrame) -> FootprintCandle:
-        dummy_ticks = [TickData(timestamp=idx, price=row['price'], size=row['volume']/row['price'] if row['price'] > 0 else 0, side=row['side'], symbol=self.symbol) for idx, row in period_df.iterrows()]
-        return self._process_ticks_into_candle(dummy_ticks)
+class FootprintAggregator:
+    def __init__(self, symbol: str = "XBTUSD", price_bin_size: float = 1.0, tick_buffer: Optional[TickBuffer] = None, stream_range_levels: Optional[int] = None):
+        self.symbol = symbol
+        self.price_bin_size = price_bin_size
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        # With stream_range_levels set, ticks are not stored and closed range candles are returned by add_*
+        self.stream = RangeFootprintStream(stream_range_levels, price_bin_size) if stream_range_levels else None
+
+    def add_tick(self, tick: TickData) -> List[FootprintCandle]:
+        if self.stream is None:
+            self.ticks.append(tick)
+            return []
+        candle = self.stream.update(tick.timestamp_ns, tick.price, tick.size * tick.price, tick.side_code)
+        return [candle] if candle else []
+
+    def add_tick_array(self, ticks: np.ndarray) -> List[FootprintCandle]:
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if self.stream is None:
+            self.ticks.extend(ticks)
+            return []
+        return self._stream_array(self.stream, ticks)
+
+    def flush(self) -> Optional[FootprintCandle]:
+        """Close the open streaming range candle"""
+        return self.stream.flush() if self.stream is not None else None
 
     def generate_footprints(self, timeframe: str = '5min') -> List[FootprintCandle]:
         if not self.ticks: return []
-        df = pd.DataFrame([{'timestamp': t.timestamp, 'price': t.price, 'volume': t.size*t.price, 'side': t.side.lower(), 'symbol':t.symbol} for t in self.ticks])
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp').sort_index()
-        resampled_groups = df.resample(timeframe)
+        histogram = TimePriceHistogram(self.ticks.sorted_array(), timeframe, self.price_bin_size)
+        return self.generate_footprints_from_histogram(histogram)
+
+    def generate_footprints_from_histogram(self, histogram: TimePriceHistogram) -> List[FootprintCandle]:
+        """Builds time-based footprint candles for all periods of a prebuilt histogram.
+
+        Each candle owns a contiguous slice of one flat bid and one flat ask array,
+        covering its own min..max price bins.
+        """
+        if not len(histogram): return []
+        period_starts = histogram.cell_starts[:-1]
+        min_bins, max_bins = histogram.cell_bins[period_starts], histogram.cell_bins[histogram.cell_starts[1:] - 1]
+        offsets = np.concatenate(([0], np.cumsum(max_bins - min_bins + 1)))
+        positions = offsets[histogram.cell_periods] + histogram.cell_bins - min_bins[histogram.cell_periods]
+
+        ask_flat, bid_flat = np.zeros(offsets[-1]), np.zeros(offsets[-1])
+        ask_flat[positions], bid_flat[positions] = histogram.buy_volume, histogram.sell_volume
+        total_ask, total_bid = np.add.reduceat(histogram.buy_volume, period_starts), np.add.reduceat(histogram.sell_volume, period_starts)
+
         all_candles = []
-        for _, period_df in resampled_groups:
-            if period_df.empty: continue
-            candle = self._process_df_into_candle(period_df)
-            if candle:
-                all_candles.append(candle)
+        for c in range(len(histogram)):
+            all_candles.append(FootprintCandle(
+                timestamp=pd.Timestamp(int(histogram.last_timestamps[c])), open=float(histogram.open[c]), high=float(histogram.high[c]), low=float(histogram.low[c]), close=float(histogram.close[c]),
+                total_volume=float(total_ask[c] + total_bid[c]), delta=float(total_ask[c] - total_bid[c]),
+                base_price=float(min_bins[c] * self.price_bin_size), bin_size=self.price_bin_size,
+                bid_volumes=bid_flat[offsets[c]:offsets[c + 1]], ask_volumes=ask_flat[offsets[c]:offsets[c + 1]]
+            ))
         return all_candles
 
     def generate_range_footprints(self, range_levels: int) -> List[FootprintCandle]:
-        """Generates range-based footprint candles with corrected logic."""
+        """Generates range-based footprint candles in a single O(n) pass over the ticks."""
         if not self.ticks or range_levels <= 1:
             return []
-        all_candles, current_ticks = [], []
-        for tick in self.ticks:
-            potential_ticks = current_ticks + [tick]
-            binned_prices = { (t.price // self.price_bin_size) * self.price_bin_size for t in potential_ticks }
-            if len(binned_prices) < 2:
-                current_ticks.append(tick)
-                continue
-            
-            price_span = max(binned_prices) - min(binned_prices)
-            levels_spanned = int(round(price_span / self.price_bin_size)) + 1
-            
-            if levels_spanned > range_levels:
-                if current_ticks:
-                    candle = self._process_ticks_into_candle(current_ticks)
-                    if candle: all_candles.append(candle)
-                current_ticks = [tick]
-            else:
-                current_ticks.append(tick)
-        if current_ticks:
-            candle = self._process_ticks_into_candle(current_ticks)
+        stream = RangeFootprintStream(range_levels, self.price_bin_size)
+        all_candles = self._stream_array(stream, self.ticks.array)
+        last_candle = stream.flush()
+        if last_candle: all_candles.append(last_candle)
+        return all_candles
+
+    def _stream_array(self, stream: 'RangeFootprintStream', ticks: np.ndarray) -> List[FootprintCandle]:
+        all_candles = []
+        volumes = ticks['size'] * ticks['price']
+        for timestamp_ns, price, volume, side in zip(ticks['timestamp'].tolist(), ticks['price'].tolist(), volumes.tolist(), ticks['side'].tolist()):
+            candle = stream.update(timestamp_ns, price, volume, side)
             if candle: all_candles.append(candle)
         return all_candles
 
     def clear_data(self):
-        self.ticks.clear()
\ No newline at end of file
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer()
\ No newline at end of file
@@ -2,11 +2,17 @@
 OHLCV (Open, High, Low, Close, Volume) aggregator
 """
 
+import math
+import numpy as np
 import pandas as pd
+from functools import reduce
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Optional
 from dataclasses import dataclass
 from exchange.models import TickData
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.timeframes import timeframe_to_ns, resample_origin_ns, period_start_ns
+from data_aggregator.bar_engine import TimeBars
 
 @dataclass
 class OHLCV:
@@ -19,71 +25,177 @@ class OHLCV:
     volume: float
     trade_count: int
 
+class OHLCVStream:
+    """Incremental OHLCV candles for one timeframe, keeping only the open candle.
+
+    Buckets follow pandas resample (anchored at midnight of the first tick) and
+    volume uses the same Kahan summation as pandas, so a replay in timestamp
+    order reproduces generate_ohlcv exactly. Ticks older than the open candle
+    are folded into it. Timeframes must be fixed ('1W' or 'M' are not).
+    """
+    
+    def __init__(self, timeframe: str):
+        self.timeframe = timeframe
+        self.period_ns = timeframe_to_ns(timeframe)
+        self._origin_ns: Optional[int] = None
+        self._start_ns: Optional[int] = None
+        self._open = self._high = self._low = self._close = 0.0
+        self._volume = self._compensation = 0.0
+        self._trade_count = 0
+    
+    def update(self, timestamp_ns: int, price: float, volume: float) -> Optional[OHLCV]:
+        """Add one tick; returns the completed candle when the period rolls over"""
+        if self._origin_ns is None:
+            self._origin_ns = resample_origin_ns(timestamp_ns)
+        start_ns = period_start_ns(timestamp_ns, self.period_ns, self._origin_ns)
+        
+        if self._start_ns is not None and start_ns <= self._start_ns:
+            if price > self._high:
+                self._high = price
+            if price < self._low:
+                self._low = price
+            self._close = price
+            y = volume - self._compensation
+            t = self._volume + y
+            self._compensation = t - self._volume - y
+            self._volume = t
+            self._trade_count += 1
+            return None
+        
+        completed = self.flush()
+        self._start_ns = start_ns
+        self._open = self._high = self._low = self._close = price
+        self._volume, self._compensation = volume, 0.0
+        self._trade_count = 1
+        return completed
+    
+    def flush(self) -> Optional[OHLCV]:
+        """Close and return the open candle, if any"""
+        if self._start_ns is None:
+            return None
+        candle = OHLCV(
+            timestamp=pd.Timestamp(self._start_ns),
+            open=self._open,
+            high=self._high,
+            low=self._low,
+            close=self._close,
+            volume=self._volume,
+            trade_count=self._trade_count
+        )
+        self._start_ns = None
+        return candle
+
 class OHLCVAggregator:
-    """Aggregates tick data into OHLCV candlesticks"""
+    """Aggregates tick data into OHLCV candlesticks.
     
-    def __init__(self, symbol: str = "XBTUSD"):
+    With stream_timeframes set, ticks are not stored: each add_* call updates
+    one open candle per timeframe and returns the candles that completed.
+    """
+    
+    def __init__(self, symbol: str = "XBTUSD", tick_buffer: Optional[TickBuffer] = None,
+                 stream_timeframes: Optional[List[str]] = None):
         self.symbol = symbol
-        self.ticks: List[TickData] = []
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        self.streams = {tf: OHLCVStream(tf) for tf in stream_timeframes or []}
     
-    def add_tick(self, tick: TickData):
+    def add_tick(self, tick: TickData) -> Dict[str, OHLCV]:
         """Add single tick"""
-        self.ticks.append(tick)
+        if not self.streams:
+            self.ticks.append(tick)
+            return {}
+        return self._update_streams(tick.timestamp_ns, tick.price, tick.size * tick.price)
     
-    def add_ticks(self, ticks: List[TickData]):
+    def add_ticks(self, ticks: List[TickData]) -> Dict[str, List[OHLCV]]:
         """Add multiple ticks"""
-        self.ticks.extend(ticks)
+        if not self.streams:
+            self.ticks.extend(ticks)
+            return {}
+        completed = {tf: [] for tf in self.streams}
+        for tick in ticks:
+            for tf, candle in self.add_tick(tick).items():
+                completed[tf].append(candle)
+        return completed
+    
+    def add_tick_array(self, ticks: np.ndarray) -> Dict[str, List[OHLCV]]:
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if not self.streams:
+            self.ticks.extend(ticks)
+            return {}
+        completed = {tf: [] for tf in self.streams}
+        volumes = ticks['size'] * ticks['price']
+        for timestamp_ns, price, volume in zip(ticks['timestamp'].tolist(), ticks['price'].tolist(), volumes.tolist()):
+            for tf, candle in self._update_streams(timestamp_ns, price, volume).items():
+                completed[tf].append(candle)
+        return completed
     
-    def _prepare_dataframe(self) -> pd.DataFrame:
-        """Convert ticks to DataFrame"""
+    def _update_streams(self, timestamp_ns: int, price: float, volume: float) -> Dict[str, OHLCV]:
+        completed = {}
+        for tf, stream in self.streams.items():
+            candle = stream.update(timestamp_ns, price, volume)
+            if candle is not None:
+                completed[tf] = candle
+        return completed
+    
+    def flush(self) -> Dict[str, OHLCV]:
+        """Close the open streaming candles"""
+        open_candles = {tf: stream.flush() for tf, stream in self.streams.items()}
+        return {tf: candle for tf, candle in open_candles.items() if candle is not None}
+    
+    def generate_bars(self, timeframe: str = '1min') -> TimeBars:
+        """OHLCV, VWAP and buy/sell volume columns per period from one pass"""
         if not self.ticks:
             raise ValueError("No tick data available")
-        
-        data = []
-        for tick in self.ticks:
-            data.append({
-                'timestamp': tick.timestamp,
-                'price': tick.price,
-                'volume': tick.size * tick.price,  # USD volume (BTC size * price)
-                'side': tick.side,
-                'symbol': tick.symbol
-            })
-        
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
-        
-        return df
+        return TimeBars(self.ticks.sorted_array(), timeframe)
     
     def generate_ohlcv(self, timeframe: str = '1min') -> List[OHLCV]:
         """Generate OHLCV candlesticks"""
-        df = self._prepare_dataframe()
+        return self._to_ohlcv(self.generate_bars(timeframe))
+    
+    def generate_ohlcv_multi(self, timeframes: List[str]) -> Dict[str, List[OHLCV]]:
+        """Generate OHLCV candlesticks for several timeframes in one pass.
         
-        # Resample to timeframe
-        resampled = df.set_index('timestamp').resample(timeframe).agg({
-            'price': ['first', 'max', 'min', 'last'],
-            'volume': 'sum',
-            'side': 'count'
-        })
+        Ticks are binned once into base bars at the greatest common divisor
+        of the timeframes; every timeframe is then rolled up from the largest
+        already-built timeframe that divides it. Calendar timeframes ('1W',
+        'M') are built from the ticks separately.
+        """
+        periods, results = {}, {}
+        for tf in timeframes:
+            try:
+                periods[tf] = timeframe_to_ns(tf)
+            except ValueError:
+                results[tf] = self.generate_ohlcv(tf)
+        if not periods:
+            return results
+        base_ns = reduce(math.gcd, periods.values())
         
-        resampled.columns = ['open', 'high', 'low', 'close', 'volume', 'trade_count']
-        resampled = resampled.dropna()
+        built = {base_ns: self.generate_bars(pd.Timedelta(base_ns, unit='ns'))}
+        for tf in sorted(periods, key=periods.get):
+            period_ns = periods[tf]
+            if period_ns not in built:
+                source_ns = max(ns for ns in built if period_ns % ns == 0)
+                built[period_ns] = built[source_ns].roll_up(tf)
+            results[tf] = self._to_ohlcv(built[period_ns])
         
-        ohlcv_data = []
-        for timestamp, row in resampled.iterrows():
-            ohlcv = OHLCV(
-                timestamp=timestamp,
-                open=row['open'],
-                high=row['high'],
-                low=row['low'],
-                close=row['close'],
-                volume=row['volume'],
-                trade_count=row['trade_count']
+        return {tf: results[tf] for tf in timeframes}
+    
+    def _to_ohlcv(self, bars: TimeBars) -> List[OHLCV]:
+        return [
+            OHLCV(
+                timestamp=pd.Timestamp(timestamp),
+                open=open_,
+                high=high,
+                low=low,
+                close=close,
+                volume=volume,
+                trade_count=trade_count
             )
-            ohlcv_data.append(ohlcv)
-        
-        return ohlcv_data
+            for timestamp, open_, high, low, close, volume, trade_count in zip(
+                bars.timestamps.tolist(), bars.open.tolist(), bars.high.tolist(), bars.low.tolist(),
+                bars.close.tolist(), bars.volume.tolist(), bars.trade_count.tolist())
+        ]
     
     def clear_data(self):
         """Clear stored data"""
-        self.ticks.clear() 
\ No newline at end of file
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer() 
\ No newline at end of file
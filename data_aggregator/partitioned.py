@@ -0,0 +1,81 @@
+"""
+Partitioned aggregation - per-file partial results that reduce into whole-range outputs
+"""
+
+import numpy as np
+from typing import List, Optional, Tuple
+
+from exchange.data_reader import read_tick_columns
+from data_aggregator.bar_engine import TimeBars
+from data_aggregator.price_histogram import TimePriceHistogram
+from data_aggregator.volume_profile_aggregator import VolumeProfileAggregator, VolumeProfile
+from data_aggregator.volume_bucket_aggregator import volume_bucket_arrays
+
+# Map steps: module level so DataReader.map_files can run them in worker processes.
+# Each one loads a single file, so peak memory is one partition per worker.
+# use_cache is passed on to read_tick_columns; row_limit keeps only the
+# file's first rows (see row_limits).
+
+def _load(file_path, use_cache: bool = True, row_limit: Optional[int] = None) -> Optional[np.ndarray]:
+    ticks = read_tick_columns(file_path, use_cache)
+    if ticks is None:
+        return None
+    return ticks[:row_limit] if row_limit is not None else ticks
+
+def _load_sorted(file_path, use_cache: bool = True, row_limit: Optional[int] = None) -> Optional[np.ndarray]:
+    ticks = _load(file_path, use_cache, row_limit)
+    if ticks is None or len(ticks) == 0:
+        return None
+    return ticks[np.argsort(ticks['timestamp'], kind='stable')]
+
+def partition_rows(file_path, use_cache: bool = True) -> int:
+    """Tick count of one file"""
+    ticks = read_tick_columns(file_path, use_cache)
+    return len(ticks) if ticks is not None else 0
+
+def partition_bars(file_path, timeframe: str, origin_ns: int, use_cache: bool = True,
+                   row_limit: Optional[int] = None) -> Optional[TimeBars]:
+    """OHLCV / VWAP / delta bars of one file"""
+    ticks = _load_sorted(file_path, use_cache, row_limit)
+    return TimeBars(ticks, timeframe, origin_ns) if ticks is not None else None
+
+def partition_profiles(file_path, timeframe: str, price_bin_size: float, origin_ns: int, use_cache: bool = True,
+                       row_limit: Optional[int] = None) -> Optional[Tuple[np.ndarray, List[VolumeProfile]]]:
+    """Period labels and VolumeProfiles of one file"""
+    ticks = _load_sorted(file_path, use_cache, row_limit)
+    if ticks is None:
+        return None
+    histogram = TimePriceHistogram(ticks, timeframe, price_bin_size, origin_ns)
+    return histogram.period_labels, VolumeProfileAggregator(price_bin_size=price_bin_size).volume_profiles_from_histogram(histogram)
+
+def partition_volume(file_path, use_cache: bool = True, row_limit: Optional[int] = None) -> float:
+    """USD volume of one file (first pass of the volume bucket reduce)"""
+    ticks = _load(file_path, use_cache, row_limit)
+    return float((ticks['size'] * ticks['price']).sum()) if ticks is not None else 0.0
+
+def partition_volume_buckets(file_path, bucket_size: float, volume_offset: float, use_cache: bool = True,
+                             row_limit: Optional[int] = None):
+    """Volume bucket columns of one file, numbered from the volume traded before it"""
+    ticks = _load_sorted(file_path, use_cache, row_limit)
+    return volume_bucket_arrays(ticks, bucket_size, volume_offset) if ticks is not None else {}
+
+# Reduce steps
+
+def merge_profiles(parts: List[Optional[Tuple[np.ndarray, List[VolumeProfile]]]]) -> List[VolumeProfile]:
+    """Sum profiles of the same period across partitions, in period order"""
+    merged = {}
+    for part in parts:
+        if part is None:
+            continue
+        for label, profile in zip(part[0].tolist(), part[1]):
+            merged[label] = merged[label] + profile if label in merged else profile
+    return [merged[label] for label in sorted(merged)]
+
+def row_limits(rows: List[int], limit: int) -> List[int]:
+    """Rows to take from each partition so that the first `limit` ticks, in file order, are used"""
+    before = np.concatenate(([0], np.cumsum(rows)[:-1])) if rows else np.empty(0, dtype=np.int64)
+    return np.clip(limit - before, 0, rows).astype(np.int64).tolist()
+
+def volume_offsets(volumes: List[float]) -> List[float]:
+    """USD volume traded before each partition"""
+    return np.concatenate(([0.0], np.cumsum(volumes)[:-1])).tolist() if volumes else []
@@ -0,0 +1,96 @@
+"""
+Time x Price histogram - bins a tick array once into (period, price bin, side) cells
+"""
+
+import numpy as np
+from typing import Optional
+from data_aggregator.timeframes import period_bounds
+from exchange.models import SIDE_BUY, SIDE_SELL
+
+# Above this many (period x bin) cells, aggregate sparsely with np.unique instead of a dense bincount
+DENSE_CELL_LIMIT = 16_000_000
+
+class TimePriceHistogram:
+    """Per-period, per-price-bin volume matrix shared by the profile and footprint aggregators.
+
+    Only populated (period, bin) cells are kept. Cells are ordered by period and
+    then by price bin; the cells of period p are cell_starts[p]:cell_starts[p + 1].
+    Periods follow pandas resample bucketing (calendar timeframes such as
+    '1W' are binned by resample itself) and empty periods are skipped.
+    """
+
+    def __init__(self, ticks: np.ndarray, timeframe: str, price_bin_size: float, origin_ns: Optional[int] = None):
+        """Bin a TICK_DTYPE array that is already in timestamp order (origin_ns as in TimeBars)"""
+        if len(ticks) == 0:
+            raise ValueError("No tick data available")
+        self.timeframe = timeframe
+        self.price_bin_size = price_bin_size
+
+        timestamps, prices = ticks['timestamp'], ticks['price']
+        volumes = ticks['size'] * prices
+        sides = ticks['side']
+
+        # Periods: contiguous runs of the resample bucket label
+        starts, labels = period_bounds(timestamps, timeframe, origin_ns)
+        ends = np.append(starts[1:], len(ticks)) - 1
+        period_index = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(ticks))))
+
+        self.period_labels = labels
+        self.first_timestamps = timestamps[starts]
+        self.last_timestamps = timestamps[ends]
+        self.open = prices[starts]
+        self.high = np.maximum.reduceat(prices, starts)
+        self.low = np.minimum.reduceat(prices, starts)
+        self.close = prices[ends]
+
+        # Cells: flattened (period, price bin) index
+        price_bins = np.floor_divide(prices, price_bin_size).astype(np.int64)
+        min_bin = int(price_bins.min())
+        n_bins = int(price_bins.max()) - min_bin + 1
+        keys = period_index * n_bins + (price_bins - min_bin)
+
+        is_buy, is_sell = sides == SIDE_BUY, sides == SIDE_SELL
+        weights = {
+            'volume': volumes,
+            'buy_volume': np.where(is_buy, volumes, 0.0),
+            'sell_volume': np.where(is_sell, volumes, 0.0),
+            'buy_count': is_buy.astype(np.float64),
+            'sell_count': is_sell.astype(np.float64),
+        }
+
+        n_cells = len(starts) * n_bins
+        if n_cells <= DENSE_CELL_LIMIT:
+            cell_keys = np.flatnonzero(np.bincount(keys, minlength=n_cells))
+            sums = {name: np.bincount(keys, weights=w, minlength=n_cells)[cell_keys] for name, w in weights.items()}
+        else:
+            cell_keys, inverse = np.unique(keys, return_inverse=True)
+            sums = {name: np.bincount(inverse, weights=w, minlength=len(cell_keys)) for name, w in weights.items()}
+
+        self.cell_periods = cell_keys // n_bins
+        self.cell_bins = cell_keys % n_bins + min_bin
+        self.cell_starts = np.searchsorted(self.cell_periods, np.arange(len(starts) + 1))
+        self.volume = sums['volume']
+        self.buy_volume = sums['buy_volume']
+        self.sell_volume = sums['sell_volume']
+        self.buy_count = sums['buy_count'].astype(np.int64)
+        self.sell_count = sums['sell_count'].astype(np.int64)
+
+    def __len__(self) -> int:
+        """Number of non-empty periods"""
+        return len(self.period_labels)
+
+    @property
+    def cell_prices(self) -> np.ndarray:
+        """Lower price of each cell's bin"""
+        return self.cell_bins * self.price_bin_size
+
+    def period_slice(self, period: int) -> slice:
+        return slice(self.cell_starts[period], self.cell_starts[period + 1])
+
+    def dense(self, column: str = 'volume'):
+        """Dense (period x bin) matrix of one cell column, with the price of each bin column"""
+        min_bin = int(self.cell_bins.min())
+        n_bins = int(self.cell_bins.max()) - min_bin + 1
+        matrix = np.zeros((len(self), n_bins))
+        matrix[self.cell_periods, self.cell_bins - min_bin] = getattr(self, column)
+        return matrix, (min_bin + np.arange(n_bins)) * self.price_bin_size
@@ -2,97 +2,329 @@
 Statistics aggregator
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict
-from exchange.models import TickData
+from typing import List, Dict, Optional
+from exchange.models import TickData, SIDE_BUY, SIDE_SELL, ticks_to_array
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.quantile_sketch import QuantileSketch, percentile_label
+
+DEFAULT_PERCENTILES = [50, 90, 99, 99.9]
+# USD size above which a trade counts as a large order, unless thresholds are given
+DEFAULT_LARGE_ORDER_THRESHOLD = 100000
+
+def threshold_label(threshold: float) -> str:
+    """Short label for a USD threshold: 100000 -> '100k', 1000000 -> '1m'"""
+    for divisor, suffix in ((1_000_000_000, 'b'), (1_000_000, 'm'), (1_000, 'k')):
+        if threshold >= divisor and threshold % divisor == 0:
+            return f"{int(threshold // divisor)}{suffix}"
+    return f"{threshold:g}"
+
+def _large_order_stats(threshold: float, buy_orders: int, sell_orders: int, buy_volume: float, sell_volume: float) -> Dict:
+    label = threshold_label(threshold)
+    stats = {
+        f'buy_orders_above_{label}': buy_orders,
+        f'sell_orders_above_{label}': sell_orders,
+        f'total_orders_above_{label}': buy_orders + sell_orders,
+        f'buy_volume_above_{label}': buy_volume,
+        f'sell_volume_above_{label}': sell_volume
+    }
+    if threshold == DEFAULT_LARGE_ORDER_THRESHOLD:
+        # Keys from before thresholds were configurable
+        stats.update({
+            'total_large_orders': buy_orders + sell_orders,
+            'large_buy_volume': buy_volume,
+            'large_sell_volume': sell_volume
+        })
+    return stats
+
+def _percentile_stats(percentiles: List[float], values) -> Dict:
+    return {percentile_label(p): float(v) for p, v in zip(percentiles, values)}
+
+class StreamingStats:
+    """Running summary statistics in bounded memory.
+    
+    Keeps counts, sums, min/max and a Welford mean/variance of price. States
+    built from different files or processes merge exactly (Chan et al. for the
+    variance) and round-trip through to_dict/from_dict for storage.
+    
+    Trade size and inter-trade time percentiles come from KLL sketches, so they
+    are approximate (see QuantileSketch for the error bound). Gaps are taken in
+    arrival order; the gap across a merge boundary is not counted.
+    """
+    
+    def __init__(self, large_order_thresholds: Optional[List[float]] = None,
+                 percentiles: Optional[List[float]] = None, sketch_k: int = 200):
+        self.large_order_thresholds = list(large_order_thresholds or [DEFAULT_LARGE_ORDER_THRESHOLD])
+        self.percentiles = list(percentiles or DEFAULT_PERCENTILES)
+        self.count = 0
+        self.min_timestamp = None
+        self.max_timestamp = None
+        self.price_min = np.inf
+        self.price_max = -np.inf
+        self.price_mean = 0.0
+        self.price_m2 = 0.0
+        self.total_volume = 0.0
+        self.largest_trade = -np.inf
+        self.buy_trades = 0
+        self.sell_trades = 0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        # Per threshold: [buy orders, sell orders, buy volume, sell volume]
+        self.large_orders = [[0, 0, 0.0, 0.0] for _ in self.large_order_thresholds]
+        self.last_timestamp = None
+        self.size_sketch = QuantileSketch(sketch_k)  # USD trade size
+        self.gap_sketch = QuantileSketch(sketch_k)   # seconds between trades
+    
+    def _add_gaps(self, timestamps: np.ndarray):
+        """Feed inter-trade times (late ticks count as 0) and advance last_timestamp"""
+        previous = np.maximum.accumulate(timestamps)
+        if self.last_timestamp is not None:
+            previous = np.maximum(previous, self.last_timestamp)
+            gaps = timestamps - np.concatenate(([self.last_timestamp], previous[:-1]))
+        else:
+            gaps = timestamps[1:] - previous[:-1]
+        self.gap_sketch.update_array(np.maximum(gaps, 0) / 1e9)
+        self.last_timestamp = int(previous[-1])
+    
+    def update(self, timestamp_ns: int, price: float, volume: float, side: int):
+        """Add one tick (epoch-ns timestamp, USD volume, side code)"""
+        self.count += 1
+        if self.min_timestamp is None or timestamp_ns < self.min_timestamp:
+            self.min_timestamp = timestamp_ns
+        if self.max_timestamp is None or timestamp_ns > self.max_timestamp:
+            self.max_timestamp = timestamp_ns
+        self.price_min = min(self.price_min, price)
+        self.price_max = max(self.price_max, price)
+        delta = price - self.price_mean
+        self.price_mean += delta / self.count
+        self.price_m2 += delta * (price - self.price_mean)
+        self.total_volume += volume
+        self.largest_trade = max(self.largest_trade, volume)
+        self.size_sketch.update(volume)
+        if self.last_timestamp is not None:
+            self.gap_sketch.update(max(timestamp_ns - self.last_timestamp, 0) / 1e9)
+        if self.last_timestamp is None or timestamp_ns > self.last_timestamp:
+            self.last_timestamp = timestamp_ns
+        
+        if side == SIDE_BUY:
+            self.buy_trades += 1
+            self.buy_volume += volume
+        elif side == SIDE_SELL:
+            self.sell_trades += 1
+            self.sell_volume += volume
+        else:
+            return
+        column = 0 if side == SIDE_BUY else 1
+        for threshold, counters in zip(self.large_order_thresholds, self.large_orders):
+            if volume > threshold:
+                counters[column] += 1
+                counters[column + 2] += volume
+    
+    def update_array(self, ticks: np.ndarray):
+        """Add a TICK_DTYPE array by summarising it vectorized and merging the result"""
+        if len(ticks) == 0:
+            return
+        chunk = StreamingStats(self.large_order_thresholds, self.percentiles, self.size_sketch.k)
+        timestamps, prices = ticks['timestamp'], ticks['price']
+        volumes = ticks['size'] * prices
+        buy_volumes, sell_volumes = volumes[ticks['side'] == SIDE_BUY], volumes[ticks['side'] == SIDE_SELL]
+        
+        chunk.count = len(ticks)
+        chunk.min_timestamp, chunk.max_timestamp = int(timestamps.min()), int(timestamps.max())
+        chunk.price_min, chunk.price_max = float(prices.min()), float(prices.max())
+        chunk.price_mean = float(prices.mean())
+        chunk.price_m2 = float(((prices - chunk.price_mean) ** 2).sum())
+        chunk.total_volume, chunk.largest_trade = float(volumes.sum()), float(volumes.max())
+        chunk.buy_trades, chunk.sell_trades = len(buy_volumes), len(sell_volumes)
+        chunk.buy_volume, chunk.sell_volume = float(buy_volumes.sum()), float(sell_volumes.sum())
+        for threshold, counters in zip(chunk.large_order_thresholds, chunk.large_orders):
+            large_buys, large_sells = buy_volumes[buy_volumes > threshold], sell_volumes[sell_volumes > threshold]
+            counters[:] = [len(large_buys), len(large_sells), float(large_buys.sum()), float(large_sells.sum())]
+        chunk.size_sketch.update_array(volumes)
+        # Gaps continue from this state's last tick
+        chunk.last_timestamp = self.last_timestamp
+        chunk._add_gaps(timestamps)
+        self.merge(chunk)
+    
+    def merge(self, other: 'StreamingStats'):
+        """Fold another partial state into this one"""
+        if other.large_order_thresholds != self.large_order_thresholds:
+            raise ValueError("Cannot merge stats with different large order thresholds")
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(StreamingStats.from_dict(other.to_dict()).__dict__)
+            return
+        
+        count = self.count + other.count
+        delta = other.price_mean - self.price_mean
+        self.price_mean += delta * other.count / count
+        self.price_m2 += other.price_m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min_timestamp = min(self.min_timestamp, other.min_timestamp)
+        self.max_timestamp = max(self.max_timestamp, other.max_timestamp)
+        self.price_min = min(self.price_min, other.price_min)
+        self.price_max = max(self.price_max, other.price_max)
+        self.total_volume += other.total_volume
+        self.largest_trade = max(self.largest_trade, other.largest_trade)
+        self.buy_trades += other.buy_trades
+        self.sell_trades += other.sell_trades
+        self.buy_volume += other.buy_volume
+        self.sell_volume += other.sell_volume
+        for counters, other_counters in zip(self.large_orders, other.large_orders):
+            for i, value in enumerate(other_counters):
+                counters[i] += value
+        self.size_sketch.merge(other.size_sketch)
+        self.gap_sketch.merge(other.gap_sketch)
+        if other.last_timestamp is not None:
+            self.last_timestamp = max(self.last_timestamp, other.last_timestamp) if self.last_timestamp is not None else other.last_timestamp
+    
+    def to_dict(self) -> Dict:
+        """Plain, JSON-serializable copy of the state"""
+        sketches = ('size_sketch', 'gap_sketch')
+        state = {name: value for name, value in self.__dict__.items() if name != 'large_orders' and name not in sketches}
+        state['large_orders'] = [list(counters) for counters in self.large_orders]
+        for name in sketches:
+            state[name] = getattr(self, name).to_dict()
+        return state
+    
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'StreamingStats':
+        stats = cls(state['large_order_thresholds'], state['percentiles'])
+        for name, value in state.items():
+            setattr(stats, name, value)
+        stats.large_order_thresholds = list(state['large_order_thresholds'])
+        stats.percentiles = list(state['percentiles'])
+        stats.large_orders = [list(counters) for counters in state['large_orders']]
+        stats.size_sketch = QuantileSketch.from_dict(state['size_sketch'])
+        stats.gap_sketch = QuantileSketch.from_dict(state['gap_sketch'])
+        return stats
+    
+    def summary(self) -> Dict:
+        """Summary in the StatsAggregator.get_summary_stats format"""
+        if self.count == 0:
+            return {}
+        
+        large_orders = {}
+        for threshold, (buy_orders, sell_orders, buy_volume, sell_volume) in zip(self.large_order_thresholds, self.large_orders):
+            large_orders.update(_large_order_stats(threshold, buy_orders, sell_orders, buy_volume, sell_volume))
+        fractions = np.asarray(self.percentiles) / 100
+        
+        return {
+            'total_ticks': self.count,
+            'time_span': pd.Timedelta(self.max_timestamp - self.min_timestamp),
+            'total_volume': self.total_volume,
+            'avg_price': self.price_mean,
+            'price_range': {
+                'min': self.price_min,
+                'max': self.price_max,
+                'std': float(np.sqrt(self.price_m2 / (self.count - 1))) if self.count > 1 else np.nan
+            },
+            'volume_stats': {
+                'total_buy_volume': self.buy_volume,
+                'total_sell_volume': self.sell_volume,
+                'avg_trade_size': self.total_volume / self.count,
+                'largest_trade': self.largest_trade
+            },
+            'trade_distribution': {
+                'buy_trades': self.buy_trades,
+                'sell_trades': self.sell_trades
+            },
+            'large_orders': large_orders,
+            'trade_size_percentiles': _percentile_stats(self.percentiles, self.size_sketch.quantiles(fractions)),
+            'inter_trade_time_percentiles': _percentile_stats(self.percentiles, self.gap_sketch.quantiles(fractions))
+        }
 
 class StatsAggregator:
     """Aggregates tick data into summary statistics"""
     
-    def __init__(self, symbol: str = "XBTUSD"):
+    def __init__(self, symbol: str = "XBTUSD", tick_buffer: Optional[TickBuffer] = None,
+                 large_order_thresholds: Optional[List[float]] = None, streaming: bool = False,
+                 percentiles: Optional[List[float]] = None):
         self.symbol = symbol
-        self.ticks: List[TickData] = []
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        # USD trade sizes above which orders are counted as large
+        self.large_order_thresholds = list(large_order_thresholds or [DEFAULT_LARGE_ORDER_THRESHOLD])
+        # Trade size / inter-trade time percentiles to report
+        self.percentiles = list(percentiles or DEFAULT_PERCENTILES)
+        # In streaming mode ticks are folded into running stats instead of being stored
+        self.stream = StreamingStats(self.large_order_thresholds, self.percentiles) if streaming else None
     
     def add_tick(self, tick: TickData):
         """Add single tick"""
-        self.ticks.append(tick)
+        if self.stream is None:
+            self.ticks.append(tick)
+        else:
+            self.stream.update(tick.timestamp_ns, tick.price, tick.size * tick.price, tick.side_code)
     
     def add_ticks(self, ticks: List[TickData]):
         """Add multiple ticks"""
-        self.ticks.extend(ticks)
+        if self.stream is None:
+            self.ticks.extend(ticks)
+        else:
+            self.stream.update_array(ticks_to_array(ticks))
     
-    def _prepare_dataframe(self) -> pd.DataFrame:
-        """Convert ticks to DataFrame"""
-        if not self.ticks:
-            raise ValueError("No tick data available")
-        
-        data = []
-        for tick in self.ticks:
-            data.append({
-                'timestamp': tick.timestamp,
-                'price': tick.price,
-                'volume': tick.size * tick.price,  # USD volume (BTC size * price)
-                'side': tick.side,
-                'symbol': tick.symbol
-            })
-        
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
-        
-        # Add derived columns
-        df['buy_volume'] = df.apply(lambda x: x['volume'] if x['side'].lower() == 'buy' else 0, axis=1)
-        df['sell_volume'] = df.apply(lambda x: x['volume'] if x['side'].lower() == 'sell' else 0, axis=1)
-        
-        return df
+    def add_tick_array(self, ticks: np.ndarray):
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if self.stream is None:
+            self.ticks.extend(ticks)
+        else:
+            self.stream.update_array(ticks)
     
     def get_summary_stats(self) -> Dict:
-        """Get summary statistics"""
+        """Get summary statistics in one vectorized pass over the tick columns"""
+        if self.stream is not None:
+            return self.stream.summary()
         if not self.ticks:
             return {}
         
-        df = self._prepare_dataframe()
+        ticks = self.ticks.array
+        timestamps, prices = ticks['timestamp'], ticks['price']
+        volumes = ticks['size'] * prices  # USD volume (BTC size * price)
+        is_buy, is_sell = ticks['side'] == SIDE_BUY, ticks['side'] == SIDE_SELL
+        buy_volumes, sell_volumes = volumes[is_buy], volumes[is_sell]
         
-        # Categorize orders by volume thresholds
-        buy_orders = df[df['side'].str.lower() == 'buy']
-        sell_orders = df[df['side'].str.lower() == 'sell']
+        large_orders = {}
+        for threshold in self.large_order_thresholds:
+            large_buys, large_sells = buy_volumes[buy_volumes > threshold], sell_volumes[sell_volumes > threshold]
+            large_orders.update(_large_order_stats(threshold, len(large_buys), len(large_sells), large_buys.sum(), large_sells.sum()))
         
-        # Orders > 100K USD
-        large_buy_orders = buy_orders[buy_orders['volume'] > 100000]
-        large_sell_orders = sell_orders[sell_orders['volume'] > 100000]
+        gaps = np.diff(np.sort(timestamps)) / 1e9
         
         stats = {
-            'total_ticks': len(df),
-            'time_span': df['timestamp'].max() - df['timestamp'].min(),
-            'total_volume': df['volume'].sum(),
-            'avg_price': df['price'].mean(),
+            'total_ticks': len(ticks),
+            'time_span': pd.Timedelta(int(timestamps.max() - timestamps.min())),
+            'total_volume': volumes.sum(),
+            'avg_price': prices.mean(),
             'price_range': {
-                'min': df['price'].min(),
-                'max': df['price'].max(),
-                'std': df['price'].std()
+                'min': prices.min(),
+                'max': prices.max(),
+                'std': prices.std(ddof=1) if len(prices) > 1 else np.nan
             },
             'volume_stats': {
-                'total_buy_volume': df['buy_volume'].sum(),
-                'total_sell_volume': df['sell_volume'].sum(),
-                'avg_trade_size': df['volume'].mean(),
-                'largest_trade': df['volume'].max()
+                'total_buy_volume': buy_volumes.sum(),
+                'total_sell_volume': sell_volumes.sum(),
+                'avg_trade_size': volumes.mean(),
+                'largest_trade': volumes.max()
             },
             'trade_distribution': {
-                'buy_trades': len(buy_orders),
-                'sell_trades': len(sell_orders)
+                'buy_trades': len(buy_volumes),
+                'sell_trades': len(sell_volumes)
             },
-            'large_orders': {
-                'buy_orders_above_100k': len(large_buy_orders),
-                'sell_orders_above_100k': len(large_sell_orders),
-                'total_large_orders': len(large_buy_orders) + len(large_sell_orders),
-                'large_buy_volume': large_buy_orders['volume'].sum() if len(large_buy_orders) > 0 else 0,
-                'large_sell_volume': large_sell_orders['volume'].sum() if len(large_sell_orders) > 0 else 0
-            }
+            'large_orders': large_orders,
+            # Exact percentiles; inverted_cdf returns actual values like the streaming sketch
+            'trade_size_percentiles': _percentile_stats(self.percentiles, np.percentile(volumes, self.percentiles, method='inverted_cdf')),
+            'inter_trade_time_percentiles': _percentile_stats(
+                self.percentiles, np.percentile(gaps, self.percentiles, method='inverted_cdf') if len(gaps) else [np.nan] * len(self.percentiles))
         }
         
         return stats
     
     def clear_data(self):
         """Clear stored data"""
-        self.ticks.clear() 
\ No newline at end of file
+        if self.stream is not None:
+            self.stream = StreamingStats(self.large_order_thresholds, self.percentiles)
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer() 
\ No newline at end of file
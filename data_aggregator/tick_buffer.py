@@ -0,0 +1,86 @@
+"""
+Tick Buffer - growable columnar tick storage shared by the aggregators
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List, Union
+from exchange.models import TickData, TickBatch, TICK_DTYPE, ticks_to_array
+
+class TickBuffer:
+    """Array-backed tick store with amortized-doubling growth.
+
+    One buffer can be passed to several aggregators, which then all read the
+    same columns instead of keeping their own copy of every tick.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.empty(max(capacity, 1), dtype=TICK_DTYPE)
+        self._size = 0
+
+    @classmethod
+    def from_array(cls, ticks: np.ndarray) -> 'TickBuffer':
+        """Wrap an existing TICK_DTYPE array without copying it"""
+        buffer = cls.__new__(cls)
+        buffer._data = np.ascontiguousarray(ticks, dtype=TICK_DTYPE)
+        buffer._size = len(buffer._data)
+        return buffer
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def array(self) -> np.ndarray:
+        """Filled part of the buffer as a TICK_DTYPE view (invalidated by growth)"""
+        return self._data[:self._size]
+
+    def sorted_array(self) -> np.ndarray:
+        """Ticks in timestamp order (stable); a view when already sorted"""
+        columns = self.array
+        timestamps = columns['timestamp']
+        if len(timestamps) < 2 or np.all(timestamps[1:] >= timestamps[:-1]):
+            return columns
+        return columns[np.argsort(timestamps, kind='stable')]
+
+    def _reserve(self, extra: int):
+        required = self._size + extra
+        if required <= len(self._data):
+            return
+        capacity = max(len(self._data), 1)
+        while capacity < required:
+            capacity *= 2
+        data = np.empty(capacity, dtype=TICK_DTYPE)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def append(self, tick: TickData):
+        """Append a single tick"""
+        self._reserve(1)
+        self._data[self._size] = (tick.timestamp_ns, tick.price, tick.size, tick.side_code)
+        self._size += 1
+
+    def extend(self, ticks: Union[List[TickData], TickBatch, np.ndarray]):
+        """Append TickData objects, a TickBatch or a TICK_DTYPE array"""
+        if isinstance(ticks, TickBatch):
+            ticks = ticks.data
+        elif not isinstance(ticks, np.ndarray):
+            ticks = ticks_to_array(list(ticks))
+        self._reserve(len(ticks))
+        self._data[self._size:self._size + len(ticks)] = ticks
+        self._size += len(ticks)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Build a DataFrame with timestamp, price, size, side (int8 code) and volume (USD)"""
+        if not self._size:
+            return pd.DataFrame()
+        columns = self.array
+        return pd.DataFrame({
+            'timestamp': columns['timestamp'].astype('datetime64[ns]'),
+            'price': columns['price'],
+            'size': columns['size'],
+            'side': columns['side'],
+            'volume': columns['size'] * columns['price'],  # USD volume (BTC size * price)
+        })
+
+    def clear(self):
+        self._size = 0
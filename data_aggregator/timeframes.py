@@ -0,0 +1,42 @@
+"""
+Timeframe helpers matching pandas resample bucketing on epoch-ns timestamps
+"""
+
+import numpy as np
+import pandas as pd
+
+DAY_NS = 86_400_000_000_000
+
+def timeframe_to_ns(timeframe: str) -> int:
+    """Length of a fixed pandas frequency string (e.g. '5min', '1h') in nanoseconds"""
+    offset = pd.tseries.frequencies.to_offset(timeframe)
+    try:
+        return int(offset.nanos)
+    except ValueError:
+        raise ValueError(f"Timeframe '{timeframe}' is not a fixed frequency")
+
+def resample_origin_ns(first_timestamp_ns: int) -> int:
+    """Bucket origin used by pandas resample (origin='start_day'): midnight of the first tick"""
+    return first_timestamp_ns - first_timestamp_ns % DAY_NS
+
+def period_start_ns(timestamp_ns, period_ns: int, origin_ns: int):
+    """Start of the resample bucket holding each timestamp (scalar or array)"""
+    return origin_ns + ((timestamp_ns - origin_ns) // period_ns) * period_ns
+
+def period_bounds(timestamps: np.ndarray, timeframe, origin_ns: int = None):
+    """First row and bucket label of each non-empty period of sorted epoch-ns timestamps.
+
+    Calendar frequencies ('1W', 'M') have no fixed length, so their bins
+    come from pandas resample directly.
+    """
+    try:
+        period_ns = timeframe_to_ns(timeframe)
+    except ValueError:
+        rows = pd.Series(np.arange(len(timestamps)), index=pd.DatetimeIndex(np.asarray(timestamps).view('datetime64[ns]')))
+        first_rows = rows.resample(timeframe).first().dropna()
+        return first_rows.to_numpy(dtype=np.int64), first_rows.index.asi8
+    if origin_ns is None:
+        origin_ns = resample_origin_ns(int(timestamps[0]))
+    labels = period_start_ns(timestamps, period_ns, origin_ns)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(labels)) + 1))
+    return starts, labels[starts]
@@ -1,12 +1,14 @@
 """
-Volume Bucket aggregator - Optimized
+Volume Bucket aggregator - Vectorized
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from exchange.models import TickData
+from exchange.models import TickData, SIDE_BUY, SIDE_SELL
+from data_aggregator.tick_buffer import TickBuffer
 
 @dataclass
 class VolumeBucket:
@@ -24,77 +26,226 @@ class VolumeBucket:
     sell_volume: float
     net_flow: float
 
+class VolumeBucketStream:
+    """Exact-size volume buckets built tick by tick.
+    
+    A tick that crosses a bucket boundary is split across the buckets, so every
+    completed bucket holds exactly bucket_size USD. Only the open bucket is kept.
+    """
+    
+    def __init__(self, bucket_size: float):
+        if bucket_size <= 0:
+            raise ValueError("bucket_size must be positive")
+        self.bucket_size = bucket_size
+        self.bucket_count = 0
+        self._open_bucket()
+    
+    def _open_bucket(self):
+        self._timestamp_ns = None
+        self._open = self._high = self._low = self._close = 0.0
+        self._volume = self._price_volume = 0.0
+        self._buy_volume = self._sell_volume = 0.0
+    
+    def update(self, timestamp_ns: int, price: float, volume: float, side: int) -> List[VolumeBucket]:
+        """Add one tick (USD volume, side code); returns the buckets it completed"""
+        completed = []
+        while True:
+            if self._timestamp_ns is None:
+                self._open = self._high = self._low = price
+            elif price > self._high:
+                self._high = price
+            elif price < self._low:
+                self._low = price
+            self._close = price
+            self._timestamp_ns = timestamp_ns
+            
+            remaining = self.bucket_size - self._volume
+            fill = volume if volume < remaining else remaining
+            self._volume += fill
+            self._price_volume += price * fill
+            if side == SIDE_BUY:
+                self._buy_volume += fill
+            elif side == SIDE_SELL:
+                self._sell_volume += fill
+            
+            if volume < remaining:
+                return completed
+            
+            # Bucket is full: carry the rest of the tick into the next one
+            self._volume = self.bucket_size
+            completed.append(self._close_bucket())
+            volume -= fill
+            if volume <= 0:
+                return completed
+    
+    def flush(self) -> Optional[VolumeBucket]:
+        """Close and return the partially filled bucket, if any"""
+        if self._timestamp_ns is None:
+            return None
+        return self._close_bucket()
+    
+    def _close_bucket(self) -> VolumeBucket:
+        bucket = VolumeBucket(
+            timestamp=pd.Timestamp(self._timestamp_ns),
+            bucket_size=self.bucket_size,
+            bucket_count=self.bucket_count,
+            total_volume=self._volume,
+            open_price=self._open,
+            high_price=self._high,
+            low_price=self._low,
+            close_price=self._close,
+            avg_price=self._price_volume / self._volume if self._volume > 0 else 0,
+            buy_volume=self._buy_volume,
+            sell_volume=self._sell_volume,
+            net_flow=self._buy_volume - self._sell_volume
+        )
+        self.bucket_count += 1
+        self._open_bucket()
+        return bucket
+
+def volume_bucket_arrays(ticks: np.ndarray, bucket_size: float, volume_offset: float = 0.0) -> Dict[str, np.ndarray]:
+    """Volume bucket columns for a sorted TICK_DTYPE array.
+    
+    volume_offset is the USD volume traded before these ticks, so a partition
+    of a longer range gets the same bucket numbers as the whole range; its first
+    and last buckets may be fragments for merge_volume_bucket_arrays.
+    """
+    price = ticks['price']
+    volume = ticks['size'] * price  # USD volume
+    
+    # Bucket numbers are non-decreasing, so each bucket is a contiguous run
+    bucket_number = ((volume_offset + np.cumsum(volume)) // bucket_size).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_number)) + 1))
+    ends = np.append(starts[1:], len(ticks)) - 1
+    
+    total_volume = np.add.reduceat(volume, starts)
+    price_volume = np.add.reduceat(price * volume, starts)
+    buy_volume = np.add.reduceat(np.where(ticks['side'] == SIDE_BUY, volume, 0.0), starts)
+    sell_volume = np.add.reduceat(np.where(ticks['side'] == SIDE_SELL, volume, 0.0), starts)
+    
+    return {
+        'timestamp': ticks['timestamp'][ends].astype('datetime64[ns]'),
+        'bucket_size': np.full(len(starts), bucket_size),
+        'bucket_count': bucket_number[starts],
+        'total_volume': total_volume,
+        'open_price': price[starts],
+        'high_price': np.maximum.reduceat(price, starts),
+        'low_price': np.minimum.reduceat(price, starts),
+        'close_price': price[ends],
+        'avg_price': np.divide(price_volume, total_volume, out=np.zeros_like(total_volume), where=total_volume > 0),
+        'buy_volume': buy_volume,
+        'sell_volume': sell_volume,
+        'net_flow': buy_volume - sell_volume
+    }
+
+def merge_volume_bucket_arrays(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Join bucket columns of consecutive partitions, combining buckets split across them"""
+    parts = [part for part in parts if part]
+    if not parts:
+        return {}
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    bucket_number = columns['bucket_count']
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_number)) + 1))
+    ends = np.append(starts[1:], len(bucket_number)) - 1
+    
+    total_volume = np.add.reduceat(columns['total_volume'], starts)
+    price_volume = np.add.reduceat(columns['avg_price'] * columns['total_volume'], starts)
+    buy_volume = np.add.reduceat(columns['buy_volume'], starts)
+    sell_volume = np.add.reduceat(columns['sell_volume'], starts)
+    
+    return {
+        'timestamp': columns['timestamp'][ends],
+        'bucket_size': columns['bucket_size'][starts],
+        'bucket_count': bucket_number[starts],
+        'total_volume': total_volume,
+        'open_price': columns['open_price'][starts],
+        'high_price': np.maximum.reduceat(columns['high_price'], starts),
+        'low_price': np.minimum.reduceat(columns['low_price'], starts),
+        'close_price': columns['close_price'][ends],
+        'avg_price': np.divide(price_volume, total_volume, out=np.zeros_like(total_volume), where=total_volume > 0),
+        'buy_volume': buy_volume,
+        'sell_volume': sell_volume,
+        'net_flow': buy_volume - sell_volume
+    }
+
 class VolumeBucketAggregator:
-    """Aggregates tick data into volume buckets - Optimized version"""
+    """Aggregates tick data into volume buckets - Vectorized version.
+    
+    With stream_bucket_size set, ticks are not stored: each add_* call feeds a
+    VolumeBucketStream and returns the exact-size buckets that completed.
+    """
     
-    def __init__(self, symbol: str = "XBTUSD"):
+    def __init__(self, symbol: str = "XBTUSD", tick_buffer: Optional[TickBuffer] = None,
+                 stream_bucket_size: Optional[float] = None):
         self.symbol = symbol
-        self.ticks: List[TickData] = []
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        self.stream = VolumeBucketStream(stream_bucket_size) if stream_bucket_size else None
     
-    def add_tick(self, tick: TickData):
+    def add_tick(self, tick: TickData) -> List[VolumeBucket]:
         """Add single tick"""
-        self.ticks.append(tick)
+        if self.stream is None:
+            self.ticks.append(tick)
+            return []
+        return self.stream.update(tick.timestamp_ns, tick.price, tick.size * tick.price, tick.side_code)
     
-    def add_ticks(self, ticks: List[TickData]):
+    def add_ticks(self, ticks: List[TickData]) -> List[VolumeBucket]:
         """Add multiple ticks"""
-        self.ticks.extend(ticks)
+        if self.stream is None:
+            self.ticks.extend(ticks)
+            return []
+        return [bucket for tick in ticks for bucket in self.add_tick(tick)]
     
-    def generate_volume_buckets(self, bucket_size: float = 1000.0) -> List[VolumeBucket]:
-        """Generate volume buckets - Optimized implementation"""
+    def add_tick_array(self, ticks: np.ndarray) -> List[VolumeBucket]:
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if self.stream is None:
+            self.ticks.extend(ticks)
+            return []
+        return self._stream_array(self.stream, ticks)
+    
+    def flush(self) -> Optional[VolumeBucket]:
+        """Close the partially filled streaming bucket"""
+        return self.stream.flush() if self.stream is not None else None
+    
+    def _stream_array(self, stream: VolumeBucketStream, ticks: np.ndarray) -> List[VolumeBucket]:
+        completed = []
+        volumes = ticks['size'] * ticks['price']
+        for timestamp_ns, price, volume, side in zip(ticks['timestamp'].tolist(), ticks['price'].tolist(),
+                                                     volumes.tolist(), ticks['side'].tolist()):
+            completed.extend(stream.update(timestamp_ns, price, volume, side))
+        return completed
+    
+    def generate_exact_volume_buckets(self, bucket_size: float = 1000.0, include_partial: bool = True) -> List[VolumeBucket]:
+        """Generate buckets holding exactly bucket_size USD each, splitting boundary ticks"""
         if not self.ticks:
             return []
         
-        # Create DataFrame directly without intermediate steps
-        df = pd.DataFrame([{
-            'timestamp': tick.timestamp,
-            'price': tick.price,
-            'volume': tick.size * tick.price,  # USD volume
-            'side': tick.side.lower()
-        } for tick in self.ticks])
-        
-        # Optimize data types and sorting
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
-        
-        # Vectorized operations for better performance
-        df['buy_volume'] = df['volume'].where(df['side'] == 'buy', 0)
-        df['sell_volume'] = df['volume'].where(df['side'] == 'sell', 0)
-        df['price_volume'] = df['price'] * df['volume']
-        
-        # Calculate cumulative volume and bucket numbers
-        df['cumulative_volume'] = df['volume'].cumsum()
-        df['bucket_number'] = (df['cumulative_volume'] // bucket_size).astype(int)
-        
-        # Group by bucket and aggregate efficiently
-        bucket_groups = df.groupby('bucket_number')
-        
-        bucket_data = []
-        for bucket_num, bucket_ticks in bucket_groups:
-            if len(bucket_ticks) == 0:
-                continue
-            
-            # Calculate all metrics in one pass
-            total_volume = bucket_ticks['volume'].sum()
-            price_volume_sum = bucket_ticks['price_volume'].sum()
-            
-            bucket = VolumeBucket(
-                timestamp=bucket_ticks.iloc[-1]['timestamp'],
-                bucket_size=bucket_size,
-                bucket_count=bucket_num,
-                total_volume=total_volume,
-                open_price=bucket_ticks.iloc[0]['price'],
-                high_price=bucket_ticks['price'].max(),
-                low_price=bucket_ticks['price'].min(),
-                close_price=bucket_ticks.iloc[-1]['price'],
-                avg_price=price_volume_sum / total_volume if total_volume > 0 else 0,
-                buy_volume=bucket_ticks['buy_volume'].sum(),
-                sell_volume=bucket_ticks['sell_volume'].sum(),
-                net_flow=bucket_ticks['buy_volume'].sum() - bucket_ticks['sell_volume'].sum()
-            )
-            bucket_data.append(bucket)
+        stream = VolumeBucketStream(bucket_size)
+        buckets = self._stream_array(stream, self.ticks.sorted_array())
+        partial = stream.flush()
+        if include_partial and partial is not None:
+            buckets.append(partial)
+        return buckets
+    
+    def generate_volume_bucket_arrays(self, bucket_size: float = 1000.0) -> Dict[str, np.ndarray]:
+        """Generate volume buckets as columns keyed by VolumeBucket field name"""
+        if not self.ticks:
+            return {}
+        return volume_bucket_arrays(self.ticks.sorted_array(), bucket_size)
+    
+    def generate_volume_buckets(self, bucket_size: float = 1000.0) -> List[VolumeBucket]:
+        """Generate volume buckets as VolumeBucket objects"""
+        columns = self.generate_volume_bucket_arrays(bucket_size)
+        if not columns:
+            return []
         
-        return bucket_data
+        timestamps = pd.DatetimeIndex(columns.pop('timestamp'))
+        values = {name: column.tolist() for name, column in columns.items()}
+        return [
+            VolumeBucket(timestamp=timestamp, **{name: column[i] for name, column in values.items()})
+            for i, timestamp in enumerate(timestamps)
+        ]
     
     def clear_data(self):
         """Clear stored data"""
-        self.ticks.clear() 
\ No newline at end of file
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer() 
\ No newline at end of file
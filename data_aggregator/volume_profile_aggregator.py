@@ -2,19 +2,177 @@
 Volume Profile aggregator - Updated for time-based aggregation
 """
 
+import numpy as np
 import pandas as pd
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 from exchange.models import TickData
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.price_histogram import TimePriceHistogram
+
+def _build_profile(timestamp, price_bins: np.ndarray, volumes: np.ndarray, va_percentage: int) -> Dict[str, Any]:
+    """Builds the profile dictionary from populated bins in ascending price order."""
+    if len(volumes) == 0:
+        return {}
+    
+    total_volume = volumes.sum()
+    
+    # POC: highest-volume bin, the higher price wins ties
+    poc_index = len(volumes) - 1 - int(np.argmax(volumes[::-1]))
+    poc = {'price': price_bins[poc_index], 'volume': volumes[poc_index]}
+    
+    low_index, high_index = _value_area_bounds(volumes, poc_index, total_volume * (va_percentage / 100))
+    
+    return {
+        'timestamp': timestamp,
+        'profile_data': [{'price_bin': price, 'volume': volume} for price, volume in zip(price_bins[::-1].tolist(), volumes[::-1].tolist())],
+        'poc': poc,
+        'value_area': {'high': price_bins[high_index], 'low': price_bins[low_index], 'percentage': va_percentage},
+        'total_volume': total_volume,
+    }
+
+def _value_area_bounds(volumes: np.ndarray, poc_index: int, target_volume: float) -> Tuple[int, int]:
+    """Grows the value area from the POC, one neighbouring bin at a time.
+
+    The larger of the next bin below and above is added until the target volume
+    is reached (ties go above). Once one side is exhausted, the remaining side
+    is resolved with a prefix-sum search instead of stepping bin by bin.
+    """
+    n = len(volumes)
+    current_volume = volumes[poc_index]
+    below, above = poc_index - 1, poc_index + 1
+    values = volumes.tolist()
+    
+    while current_volume < target_volume and below >= 0 and above < n:
+        if values[below] > values[above]:
+            current_volume += values[below]
+            below -= 1
+        else:
+            current_volume += values[above]
+            above += 1
+    
+    if current_volume < target_volume and above < n:
+        needed = np.cumsum(volumes[above:])
+        steps = min(int(np.searchsorted(needed, target_volume - current_volume)) + 1, len(needed))
+        above += steps
+    elif current_volume < target_volume and below >= 0:
+        needed = np.cumsum(volumes[below::-1])
+        steps = min(int(np.searchsorted(needed, target_volume - current_volume)) + 1, len(needed))
+        below -= steps
+    
+    return below + 1, above - 1
+
+class VolumeProfile:
+    """Mergeable volume profile: a sparse price-bin -> volume map plus its bin size.
+    
+    Bins are integer indices (bin k covers [k * price_bin_size, (k + 1) * price_bin_size)),
+    so profiles from different periods or sessions can be summed and rebinned in
+    O(bins) without going back to the ticks.
+    """
+    
+    def __init__(self, price_bin_size: float, volumes: Optional[Dict[int, float]] = None, timestamp=None):
+        self.price_bin_size = price_bin_size
+        self.volumes: Dict[int, float] = dict(volumes or {})
+        self.timestamp = timestamp
+    
+    @classmethod
+    def from_dict(cls, profile: Dict[str, Any], price_bin_size: float) -> 'VolumeProfile':
+        """Rebuilds a profile from a generate_profiles_by_timeframe dictionary."""
+        volumes = {int(round(row['price_bin'] / price_bin_size)): row['volume'] for row in profile['profile_data']}
+        return cls(price_bin_size, volumes, profile.get('timestamp'))
+    
+    @property
+    def total_volume(self) -> float:
+        return sum(self.volumes.values())
+    
+    def rebin(self, price_bin_size: float) -> 'VolumeProfile':
+        """Coarser copy of the profile; the new bin size must be a whole multiple of the current one."""
+        factor = int(round(price_bin_size / self.price_bin_size))
+        if factor < 1 or not np.isclose(factor * self.price_bin_size, price_bin_size):
+            raise ValueError(f"Cannot rebin from {self.price_bin_size} to {price_bin_size}")
+        if factor == 1:
+            return VolumeProfile(self.price_bin_size, self.volumes, self.timestamp)
+        volumes: Dict[int, float] = {}
+        for price_bin, volume in self.volumes.items():
+            volumes[price_bin // factor] = volumes.get(price_bin // factor, 0.0) + volume
+        return VolumeProfile(price_bin_size, volumes, self.timestamp)
+    
+    def __add__(self, other: 'VolumeProfile') -> 'VolumeProfile':
+        left, right = self, other
+        if not np.isclose(left.price_bin_size, right.price_bin_size):
+            coarser = max(left.price_bin_size, right.price_bin_size)
+            left, right = left.rebin(coarser), right.rebin(coarser)
+        volumes = dict(left.volumes)
+        for price_bin, volume in right.volumes.items():
+            volumes[price_bin] = volumes.get(price_bin, 0.0) + volume
+        timestamps = [t for t in (left.timestamp, right.timestamp) if t is not None]
+        return VolumeProfile(left.price_bin_size, volumes, min(timestamps) if timestamps else None)
+    
+    @classmethod
+    def composite(cls, profiles: List['VolumeProfile']) -> 'VolumeProfile':
+        """Sums several session profiles into one composite profile (one pass over their bins)."""
+        if not profiles:
+            raise ValueError("No profiles to composite")
+        price_bin_size = max(profile.price_bin_size for profile in profiles)
+        volumes: Dict[int, float] = {}
+        for profile in profiles:
+            if not np.isclose(profile.price_bin_size, price_bin_size):
+                profile = profile.rebin(price_bin_size)
+            for price_bin, volume in profile.volumes.items():
+                volumes[price_bin] = volumes.get(price_bin, 0.0) + volume
+        timestamps = [profile.timestamp for profile in profiles if profile.timestamp is not None]
+        return cls(price_bin_size, volumes, min(timestamps) if timestamps else None)
+    
+    def to_dict(self, va_percentage: int = 70) -> Dict[str, Any]:
+        """Profile dictionary in the generate_profiles_by_timeframe format (POC, value area, ...)."""
+        price_bins = np.array(sorted(self.volumes), dtype=np.int64)
+        volumes = np.array([self.volumes[price_bin] for price_bin in price_bins.tolist()], dtype=np.float64)
+        return _build_profile(self.timestamp, price_bins * self.price_bin_size, volumes, va_percentage)
+
+def rolling_composite(profiles: List[VolumeProfile], window: int) -> List[VolumeProfile]:
+    """Composite of each profile with the window - 1 profiles before it.
+    
+    One running composite is kept: each step adds the entering profile's bins
+    and subtracts the leaving one's, so the cost is O(bins) per step rather
+    than O(window * bins). A bin is dropped once no profile in the window
+    has it. Profiles are expected in time order (the window's timestamp is
+    its first profile's); mixed bin sizes are rebinned to the coarsest.
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if not profiles:
+        return []
+    price_bin_size = max(profile.price_bin_size for profile in profiles)
+    profiles = [profile if np.isclose(profile.price_bin_size, price_bin_size) else profile.rebin(price_bin_size)
+                for profile in profiles]
+    
+    volumes: Dict[int, float] = {}
+    counts: Dict[int, int] = {}  # profiles in the window that have each bin
+    composites = []
+    for i, profile in enumerate(profiles):
+        for price_bin, volume in profile.volumes.items():
+            volumes[price_bin] = volumes.get(price_bin, 0.0) + volume
+            counts[price_bin] = counts.get(price_bin, 0) + 1
+        if i >= window:
+            for price_bin, volume in profiles[i - window].volumes.items():
+                counts[price_bin] -= 1
+                if counts[price_bin]:
+                    volumes[price_bin] -= volume
+                else:
+                    del counts[price_bin], volumes[price_bin]
+        first = profiles[max(0, i - window + 1)]
+        timestamp = first.timestamp if first.timestamp is not None else profile.timestamp
+        composites.append(VolumeProfile(price_bin_size, volumes, timestamp))
+    return composites
 
 class VolumeProfileAggregator:
     """Aggregates tick data into Volume Profiles for specified timeframes."""
     
-    def __init__(self, symbol: str = "XBTUSD", price_bin_size: float = 1.0):
+    def __init__(self, symbol: str = "XBTUSD", price_bin_size: float = 1.0, tick_buffer: Optional[TickBuffer] = None):
         self.symbol = symbol
         self.price_bin_size = price_bin_size
-        self.ticks: List[TickData] = []
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
     
     def add_tick(self, tick: TickData):
         self.ticks.append(tick)
@@ -22,78 +180,16 @@ class VolumeProfileAggregator:
     def add_ticks(self, ticks: List[TickData]):
         self.ticks.extend(ticks)
     
-    def _prepare_dataframe(self) -> pd.DataFrame:
-        if not self.ticks:
-            return pd.DataFrame()
-        
-        data = [{'timestamp': tick.timestamp, 'price': tick.price, 'volume': tick.size * tick.price} for tick in self.ticks]
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.set_index('timestamp').sort_index()
-        return df
-
-    def _calculate_profile_for_period(self, period_df: pd.DataFrame, va_percentage: int) -> Dict[str, Any]:
-        """Calculates a single volume profile for a given DataFrame (a period of time)."""
-        if period_df.empty:
-            return {}
-
-        # 1. Bin prices
-        period_df = period_df.copy()
-        period_df['price_bin'] = (period_df['price'] // self.price_bin_size) * self.price_bin_size
-        
-        # 2. Group by price bin and sum volumes
-        profile_data = period_df.groupby('price_bin')['volume'].sum().reset_index().sort_values('price_bin', ascending=False)
-        
-        if profile_data.empty:
-            return {}
-            
-        total_volume = profile_data['volume'].sum()
-        
-        # 3. Find POC
-        poc_row = profile_data.loc[profile_data['volume'].idxmax()]
-        poc = {'price': poc_row['price_bin'], 'volume': poc_row['volume']}
-        
-        # 4. Calculate Value Area
-        target_va_volume = total_volume * (va_percentage / 100)
-        poc_index = poc_row.name
-        
-        va_rows = profile_data.loc[[poc_index]].copy()
-        current_va_volume = poc['volume']
-        
-        rows_below = profile_data.loc[:poc_index-1].sort_index(ascending=False)
-        rows_above = profile_data.loc[poc_index+1:].sort_index(ascending=True)
-        
-        below_idx, above_idx = 0, 0
-        
-        while current_va_volume < target_va_volume:
-            vol_below = rows_below.iloc[below_idx]['volume'] if below_idx < len(rows_below) else -1
-            vol_above = rows_above.iloc[above_idx]['volume'] if above_idx < len(rows_above) else -1
-            
-            if vol_below == -1 and vol_above == -1: break
-
-            if vol_below > vol_above:
-                current_va_volume += vol_below
-                va_rows = pd.concat([va_rows, rows_below.iloc[[below_idx]]])
-                below_idx += 1
-            else:
-                current_va_volume += vol_above
-                va_rows = pd.concat([va_rows, rows_above.iloc[[above_idx]]])
-                above_idx += 1
-
-        return {
-            'timestamp': period_df.index.min(),
-            'profile_data': profile_data.to_dict('records'),
-            'poc': poc,
-            'value_area': {'high': va_rows['price_bin'].max(), 'low': va_rows['price_bin'].min(), 'percentage': va_percentage},
-            'total_volume': total_volume,
-        }
-
+    def add_tick_array(self, ticks: np.ndarray):
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        self.ticks.extend(ticks)
+    
     def generate_profiles_by_timeframe(self, timeframe: str, va_percentage: int = 70) -> List[Dict[str, Any]]:
         """
         Generates a list of volume profiles, one for each period in the specified timeframe.
         
         Args:
-            timeframe (str): A pandas-compatible frequency string (e.g., '1H', '30min', '1D').
+            timeframe (str): A pandas frequency string (e.g., '1H', '30min', '1D', '1W').
             va_percentage (int): The percentage for the Value Area calculation.
             
         Returns:
@@ -101,22 +197,38 @@ class VolumeProfileAggregator:
         """
         if not self.ticks:
             return []
-            
-        df = self._prepare_dataframe()
-        if df.empty:
-            return []
-            
-        # Use pandas resample to group data by clock-based timeframes
-        resampled_groups = df.resample(timeframe)
         
+        histogram = TimePriceHistogram(self.ticks.sorted_array(), timeframe, self.price_bin_size)
+        return self.generate_profiles_from_histogram(histogram, va_percentage)
+
+    def generate_profiles_from_histogram(self, histogram: TimePriceHistogram, va_percentage: int = 70) -> List[Dict[str, Any]]:
+        """Reads every period's POC and value area from a prebuilt (possibly shared) histogram."""
+        cell_prices = histogram.cell_prices
         all_profiles = []
-        for period_timestamp, period_df in resampled_groups:
-            if not period_df.empty:
-                profile = self._calculate_profile_for_period(period_df, va_percentage)
-                if profile:
-                    all_profiles.append(profile)
-                    
+        for period in range(len(histogram)):
+            cells = histogram.period_slice(period)
+            profile = _build_profile(pd.Timestamp(int(histogram.first_timestamps[period])), cell_prices[cells], histogram.volume[cells], va_percentage)
+            if profile:
+                all_profiles.append(profile)
+        
         return all_profiles
 
+    def generate_volume_profiles(self, timeframe: str) -> List[VolumeProfile]:
+        """Generates one mergeable VolumeProfile per period of the timeframe."""
+        if not self.ticks:
+            return []
+        
+        histogram = TimePriceHistogram(self.ticks.sorted_array(), timeframe, self.price_bin_size)
+        return self.volume_profiles_from_histogram(histogram)
+
+    def volume_profiles_from_histogram(self, histogram: TimePriceHistogram) -> List[VolumeProfile]:
+        profiles = []
+        for period in range(len(histogram)):
+            cells = histogram.period_slice(period)
+            volumes = dict(zip(histogram.cell_bins[cells].tolist(), histogram.volume[cells].tolist()))
+            profiles.append(VolumeProfile(histogram.price_bin_size, volumes, pd.Timestamp(int(histogram.first_timestamps[period]))))
+        return profiles
+
     def clear_data(self):
-        self.ticks.clear()
\ No newline at end of file
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer()
\ No newline at end of file
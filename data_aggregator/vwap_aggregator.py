@@ -2,90 +2,296 @@
 VWAP (Volume Weighted Average Price) aggregator
 """
 
+import bisect
+import math
+import numpy as np
 import pandas as pd
+from collections import deque
 from datetime import datetime
-from typing import List
+from typing import List, Dict, Optional
 from dataclasses import dataclass
-from exchange.models import TickData
+from exchange.models import TickData, timestamp_to_ns
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.timeframes import DAY_NS, timeframe_to_ns
+from data_aggregator.bar_engine import TimeBars
+
+# 1970-01-01 was a Thursday; weekly anchors start on Monday 00:00 UTC
+WEEK_OFFSET_NS = 4 * DAY_NS
 
 @dataclass
 class VWAPData:
-    """Volume Weighted Average Price data"""
+    """Volume Weighted Average Price data (volumes in base-asset size)"""
     timestamp: datetime
     vwap: float
     volume: float
     cumulative_volume: float
     cumulative_pv: float
 
-class VWAPAggregator:
-    """Aggregates tick data into VWAP calculations"""
+@dataclass
+class VWAPLevel:
+    """Current value of one anchored or rolling VWAP"""
+    timestamp: datetime      # last tick
+    start: datetime          # anchor time, or oldest tick in a rolling window
+    vwap: float
+    std: float               # volume-weighted standard deviation of price
+    volume: float            # base-asset size in the VWAP
+    upper_bands: List[float]
+    lower_bands: List[float]
+
+class _WeightedSums:
+    """Size-weighted sums of price and price^2, relative to a reference price.
     
-    def __init__(self, symbol: str = "XBTUSD"):
-        self.symbol = symbol
-        self.ticks: List[TickData] = []
+    Prices are offset by the first price seen so p^2 terms stay small and
+    the variance does not lose precision to cancellation.
+    """
     
-    def add_tick(self, tick: TickData):
-        """Add single tick"""
-        self.ticks.append(tick)
+    def __init__(self):
+        self.reference = None
+        self.volume = self.pv = self.p2v = 0.0
     
-    def add_ticks(self, ticks: List[TickData]):
-        """Add multiple ticks"""
-        self.ticks.extend(ticks)
+    def add(self, price: float, size: float):
+        if self.reference is None:
+            self.reference = price
+        offset = price - self.reference
+        self.volume += size
+        self.pv += offset * size
+        self.p2v += offset * offset * size
     
-    def _prepare_dataframe(self) -> pd.DataFrame:
-        """Convert ticks to DataFrame"""
-        if not self.ticks:
-            raise ValueError("No tick data available")
+    def remove(self, price: float, size: float):
+        offset = price - self.reference
+        self.volume -= size
+        self.pv -= offset * size
+        self.p2v -= offset * offset * size
+    
+    def mean_std(self):
+        mean = self.pv / self.volume
+        return self.reference + mean, math.sqrt(max(self.p2v / self.volume - mean * mean, 0.0))
+
+class AnchoredVWAP:
+    """VWAP accumulated since the latest anchor; O(1) per tick, no ticks kept.
+    
+    anchor_key maps an epoch-ns timestamp to an increasing anchor id (None
+    before the first anchor). A new id resets the sums; late ticks are folded
+    into the current anchor.
+    """
+    
+    def __init__(self, anchor_key, anchor_start):
+        self.anchor_key = anchor_key
+        self.anchor_start = anchor_start
+        self._key = None
+        self._sums = _WeightedSums()
+        self._start_ns = self._last_ns = None
+    
+    def update(self, timestamp_ns: int, price: float, size: float) -> bool:
+        """Add one tick; returns False if it falls before the first anchor"""
+        key = self.anchor_key(timestamp_ns)
+        if key is None:
+            return False
+        if self._key is None or key > self._key:
+            self._key = key
+            self._sums = _WeightedSums()
+            self._start_ns = self.anchor_start(key)
+        self._sums.add(price, size)
+        self._last_ns = max(timestamp_ns, self._last_ns or timestamp_ns)
+        return True
+    
+    def level(self, band_multipliers: List[float]) -> Optional[VWAPLevel]:
+        if self._key is None or self._sums.volume <= 0:
+            return None
+        return _make_level(self._last_ns, self._start_ns, self._sums, band_multipliers)
+
+class RollingVWAP:
+    """VWAP over a trailing time window (ns) or the last `volume_window` base size.
+    
+    Only the ticks inside the window are kept. The oldest tick of a volume
+    window is trimmed so the window holds exactly volume_window once filled.
+    Running sums are rebuilt from the window after as many evictions as it
+    holds, which bounds floating point drift at O(1) amortized cost.
+    """
+    
+    def __init__(self, time_window_ns: Optional[int] = None, volume_window: Optional[float] = None):
+        if (time_window_ns is None) == (volume_window is None):
+            raise ValueError("Give exactly one of time_window_ns or volume_window")
+        if (time_window_ns if time_window_ns is not None else volume_window) <= 0:
+            raise ValueError("Rolling VWAP window must be positive")
+        self.time_window_ns = time_window_ns
+        self.volume_window = volume_window
+        self._window = deque()  # [timestamp_ns, price, size]
+        self._sums = _WeightedSums()
+        self._evictions = 0
+    
+    def update(self, timestamp_ns: int, price: float, size: float) -> bool:
+        self._window.append([timestamp_ns, price, size])
+        self._sums.add(price, size)
+        
+        if self.time_window_ns is not None:
+            cutoff = timestamp_ns - self.time_window_ns
+            while self._window[0][0] <= cutoff:
+                _, old_price, old_size = self._window.popleft()
+                self._sums.remove(old_price, old_size)
+                self._evictions += 1
+        else:
+            while self._sums.volume - self._window[0][2] >= self.volume_window:
+                _, old_price, old_size = self._window.popleft()
+                self._sums.remove(old_price, old_size)
+                self._evictions += 1
+            excess = self._sums.volume - self.volume_window
+            if excess > 0:
+                self._window[0][2] -= excess
+                self._sums.remove(self._window[0][1], excess)
         
-        data = []
-        for tick in self.ticks:
-            data.append({
-                'timestamp': tick.timestamp,
-                'price': tick.price,
-                'volume': tick.size * tick.price,  # USD volume (BTC size * price)
-                'side': tick.side,
-                'symbol': tick.symbol
-            })
+        if self._evictions > len(self._window):
+            self._rebuild()
+        return True
+    
+    def _rebuild(self):
+        self._sums = _WeightedSums()
+        for _, price, size in self._window:
+            self._sums.add(price, size)
+        self._evictions = 0
+    
+    def level(self, band_multipliers: List[float]) -> Optional[VWAPLevel]:
+        if not self._window or self._sums.volume <= 0:
+            return None
+        return _make_level(self._window[-1][0], self._window[0][0], self._sums, band_multipliers)
+
+def _make_level(last_ns: int, start_ns: int, sums: _WeightedSums, band_multipliers: List[float]) -> VWAPLevel:
+    vwap, std = sums.mean_std()
+    return VWAPLevel(
+        timestamp=pd.Timestamp(last_ns),
+        start=pd.Timestamp(start_ns),
+        vwap=vwap,
+        std=std,
+        volume=sums.volume,
+        upper_bands=[vwap + k * std for k in band_multipliers],
+        lower_bands=[vwap - k * std for k in band_multipliers]
+    )
+
+def _periodic_anchor(period_ns: int, offset_ns: int = 0) -> AnchoredVWAP:
+    return AnchoredVWAP(lambda ts: (ts - offset_ns) // period_ns,
+                        lambda key: key * period_ns + offset_ns)
+
+class VWAPStream:
+    """Live anchored and rolling VWAPs with standard-deviation bands.
+    
+    anchors: any of 'session' (daily, starting at session_open, e.g. '13h30min'),
+    'daily' (00:00 UTC) and 'weekly' (Monday 00:00 UTC). custom_anchors adds an
+    'anchored' VWAP restarted at each given timestamp. time_windows ('1h', ...)
+    and volume_windows (base size) add rolling VWAPs named 'rolling_1h' and
+    'rolling_vol_50'. All VWAPs are weighted by base-asset size. Timestamps are
+    UTC epoch-ns.
+    """
+    
+    def __init__(self, anchors: Optional[List[str]] = None, custom_anchors: Optional[List] = None,
+                 time_windows: Optional[List[str]] = None, volume_windows: Optional[List[float]] = None,
+                 session_open: str = '0h', band_multipliers: Optional[List[float]] = None):
+        self.band_multipliers = list(band_multipliers or [1.0, 2.0])
+        self.trackers = {}
         
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp').reset_index(drop=True)
+        for anchor in anchors if anchors is not None else ['daily']:
+            if anchor == 'session':
+                self.trackers['session'] = _periodic_anchor(DAY_NS, int(pd.to_timedelta(session_open).value))
+            elif anchor == 'daily':
+                self.trackers['daily'] = _periodic_anchor(DAY_NS)
+            elif anchor == 'weekly':
+                self.trackers['weekly'] = _periodic_anchor(7 * DAY_NS, WEEK_OFFSET_NS)
+            else:
+                raise ValueError(f"Unknown anchor '{anchor}'")
         
-        # Add price * volume column
-        df['price_volume'] = df['price'] * df['volume']
+        if custom_anchors:
+            points = sorted(timestamp_to_ns(t) for t in custom_anchors)
+            self.trackers['anchored'] = AnchoredVWAP(
+                lambda ts: (bisect.bisect_right(points, ts) - 1) if ts >= points[0] else None,
+                lambda key: points[key])
         
-        return df
+        for window in time_windows or []:
+            self.trackers[f'rolling_{window}'] = RollingVWAP(time_window_ns=timeframe_to_ns(window))
+        for window in volume_windows or []:
+            self.trackers[f'rolling_vol_{window:g}'] = RollingVWAP(volume_window=window)
+    
+    def add(self, timestamp_ns: int, price: float, size: float):
+        """Add one tick (base-asset size) without building levels"""
+        for tracker in self.trackers.values():
+            tracker.update(timestamp_ns, price, size)
+    
+    def update(self, timestamp_ns: int, price: float, size: float) -> Dict[str, VWAPLevel]:
+        """Add one tick (base-asset size); returns the VWAPs it updated"""
+        levels = {}
+        for name, tracker in self.trackers.items():
+            if tracker.update(timestamp_ns, price, size):
+                level = tracker.level(self.band_multipliers)
+                if level is not None:
+                    levels[name] = level
+        return levels
+    
+    def levels(self) -> Dict[str, VWAPLevel]:
+        """Current value of every VWAP that has data"""
+        levels = {name: tracker.level(self.band_multipliers) for name, tracker in self.trackers.items()}
+        return {name: level for name, level in levels.items() if level is not None}
+
+class VWAPAggregator:
+    """Aggregates tick data into VWAP calculations.
+    
+    With a VWAPStream passed as stream, ticks are not stored: each add_* call
+    updates the stream and returns the latest VWAP levels.
+    """
+    
+    def __init__(self, symbol: str = "XBTUSD", tick_buffer: Optional[TickBuffer] = None,
+                 stream: Optional[VWAPStream] = None):
+        self.symbol = symbol
+        self.ticks = tick_buffer if tick_buffer is not None else TickBuffer()
+        self.stream = stream
+    
+    def add_tick(self, tick: TickData) -> Dict[str, VWAPLevel]:
+        """Add single tick"""
+        if self.stream is None:
+            self.ticks.append(tick)
+            return {}
+        return self.stream.update(tick.timestamp_ns, tick.price, tick.size)
+    
+    def add_ticks(self, ticks: List[TickData]) -> Dict[str, VWAPLevel]:
+        """Add multiple ticks"""
+        if self.stream is None:
+            self.ticks.extend(ticks)
+            return {}
+        for tick in ticks:
+            self.stream.add(tick.timestamp_ns, tick.price, tick.size)
+        return self.stream.levels()
+    
+    def add_tick_array(self, ticks: np.ndarray) -> Dict[str, VWAPLevel]:
+        """Add a TICK_DTYPE array (e.g. from DataReader.read_columns)"""
+        if self.stream is None:
+            self.ticks.extend(ticks)
+            return {}
+        for timestamp, price, size in zip(ticks['timestamp'].tolist(), ticks['price'].tolist(), ticks['size'].tolist()):
+            self.stream.add(timestamp, price, size)
+        return self.stream.levels()
     
     def generate_vwap(self, timeframe: str = '1min') -> List[VWAPData]:
-        """Generate VWAP data"""
-        df = self._prepare_dataframe()
-        
-        # Resample to timeframe
-        resampled = df.set_index('timestamp').resample(timeframe).agg({
-            'price_volume': 'sum',
-            'volume': 'sum'
-        })
-        
-        resampled = resampled.dropna()
+        """Generate cumulative VWAP per period, weighted by base-asset size"""
+        if not self.ticks:
+            raise ValueError("No tick data available")
+        bars = TimeBars(self.ticks.sorted_array(), timeframe)
         
-        # Calculate cumulative values
-        resampled['cumulative_pv'] = resampled['price_volume'].cumsum()
-        resampled['cumulative_volume'] = resampled['volume'].cumsum()
-        resampled['vwap'] = resampled['cumulative_pv'] / resampled['cumulative_volume']
+        # bars.volume is sum(price * size) per period
+        cumulative_pv = np.cumsum(bars.volume)
+        cumulative_volume = np.cumsum(bars.size)
+        vwap = cumulative_pv / cumulative_volume
         
-        vwap_data = []
-        for timestamp, row in resampled.iterrows():
-            vwap = VWAPData(
-                timestamp=timestamp,
-                vwap=row['vwap'],
-                volume=row['volume'],
-                cumulative_volume=row['cumulative_volume'],
-                cumulative_pv=row['cumulative_pv']
+        return [
+            VWAPData(
+                timestamp=pd.Timestamp(timestamp),
+                vwap=value,
+                volume=volume,
+                cumulative_volume=cum_volume,
+                cumulative_pv=cum_pv
             )
-            vwap_data.append(vwap)
-        
-        return vwap_data
+            for timestamp, value, volume, cum_volume, cum_pv in zip(
+                bars.timestamps.tolist(), vwap.tolist(), bars.size.tolist(),
+                cumulative_volume.tolist(), cumulative_pv.tolist())
+        ]
     
     def clear_data(self):
         """Clear stored data"""
-        self.ticks.clear() 
\ No newline at end of file
+        # Detach rather than clear so a shared buffer stays intact
+        self.ticks = TickBuffer() 
\ No newline at end of file
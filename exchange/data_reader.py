@@ -1,85 +1,391 @@
+import numpy as np
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from datetime import datetime
+import os
 import re
+import sys
 
-from exchange.models import TickData
+from exchange.models import TickData, TICK_DTYPE, SIDE_UNKNOWN, side_code, timestamp_to_ns
+from exchange.tick_store import TickStore
+from exchange.partition_index import PartitionIndex
+
+# Columns and dtypes of the raw trade CSVs used by the columnar loaders
+CSV_COLUMNS = ['timestamp', 'price', 'volume', 'side']
+CSV_DTYPES = {'timestamp': np.int64, 'price': np.float64, 'volume': np.float64, 'side': 'category'}
+
+# Parsed TICK_DTYPE copies of the CSVs live in this directory next to them
+CACHE_DIR_NAME = '.cache'
+# Sorted, indexed segments for read_range
+STORE_DIR_NAME = '.store'
+# Default rows per chunk for iterate_chunks
+CHUNK_SIZE = 1_000_000
+# Files queued per pool worker in map_files
+MAX_IN_FLIGHT = 2
+
+def _read_csv_file(file_path):
+    return pd.read_csv(file_path) if file_path.exists() else None
+
+def read_tick_columns(file_path, use_cache=True):
+    """Load one CSV as a TICK_DTYPE array (module level so pool workers can pickle it).
+    
+    With use_cache, the parsed array is saved as .npy under CACHE_DIR_NAME, keyed
+    on the CSV's size and mtime, and later loads memory-map it instead of
+    parsing. A changed CSV gets a new key and its old cache file is removed.
+    """
+    if not file_path.exists():
+        return None
+    
+    if not use_cache:
+        return _parse_tick_columns(file_path)
+    
+    columns = _load_cache(file_path)
+    if columns is not None:
+        return columns
+    
+    columns = _parse_tick_columns(file_path)
+    _write_cache(file_path, _cache_path(file_path), columns)
+    return columns
+
+def _cache_path(file_path):
+    stat = file_path.stat()
+    return file_path.parent / CACHE_DIR_NAME / f"{file_path.name}.{stat.st_size}-{stat.st_mtime_ns}.npy"
+
+def _load_cache(file_path):
+    """Memory map of the file's current .npy cache, or None if there is none"""
+    cache_path = _cache_path(file_path)
+    if cache_path.exists():
+        try:
+            return np.load(cache_path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass  # truncated or unreadable cache file: parse again and overwrite it
+    return None
+
+def _sort_ticks(ticks):
+    """ticks in timestamp order; an already sorted array (the usual case) is returned as is"""
+    timestamps = ticks['timestamp']
+    if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+        return ticks[np.argsort(timestamps, kind='stable')]
+    return ticks
+
+def _ordered_pieces(arrays):
+    """Split sorted arrays (one per file, in date order) into pieces whose concatenation is sorted.
+    
+    Late ticks at the start of a file that fall before the end of the
+    previous file are merged with the overlapping tail of that file; the
+    rest of each file passes through unchanged (memory maps stay mapped).
+    """
+    current = None
+    for ticks in arrays:
+        if not len(ticks):
+            continue
+        if current is None:
+            current = ticks
+            continue
+        timestamps, last_ts = ticks['timestamp'], current['timestamp'][-1]
+        if timestamps[0] >= last_ts:
+            yield current
+            current = ticks
+            continue
+        split = int(np.searchsorted(current['timestamp'], timestamps[0], side='right'))
+        overlap = int(np.searchsorted(timestamps, last_ts, side='right'))
+        merged = np.concatenate([current[split:], ticks[:overlap]])
+        yield current[:split]
+        current = merged[np.argsort(merged['timestamp'], kind='stable')]
+        if overlap < len(ticks):
+            yield current
+            current = ticks[overlap:]
+    if current is not None:
+        yield current
+
+def _write_cache(file_path, cache_path, columns):
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        for stale in cache_path.parent.glob(f"{file_path.name}.*-*.npy"):
+            stale.unlink()
+        # Write then rename so readers (and other workers) never see a partial file
+        temp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.save(f, columns)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        pass  # read-only data directory: work without the cache
+
+def _parse_tick_columns(file_path):
+    try:
+        df = pd.read_csv(file_path, usecols=CSV_COLUMNS, dtype=CSV_DTYPES)
+    except (ValueError, TypeError):
+        df = _read_columns_lenient(file_path)
+    
+    return _frame_to_columns(df)
+
+def _read_columns_lenient(file_path):
+    """Slow path for files with missing columns or malformed rows"""
+    return _coerce_columns(pd.read_csv(file_path))
+
+def _coerce_columns(df):
+    df = df.reindex(columns=CSV_COLUMNS)
+    for column in ['timestamp', 'price', 'volume']:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df = df.dropna(subset=['timestamp', 'price', 'volume'])
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    df['side'] = df['side'].fillna('').astype(str).astype('category')
+    return df
+
+def _frame_to_columns(df):
+    columns = np.empty(len(df), dtype=TICK_DTYPE)
+    columns['timestamp'] = df['timestamp'].to_numpy(dtype=np.int64) * 1_000_000  # ms -> ns
+    columns['price'] = df['price'].to_numpy(dtype=np.float64)
+    columns['size'] = df['volume'].to_numpy(dtype=np.float64)
+    
+    # Map each side category once instead of every row
+    sides = df['side']
+    lookup = np.array([side_code(c) for c in sides.cat.categories], dtype=np.int8)
+    codes = sides.cat.codes.to_numpy()
+    columns['side'] = np.where(codes >= 0, lookup[codes] if len(lookup) else SIDE_UNKNOWN, SIDE_UNKNOWN)
+    return columns
 
 class DataReader:
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", max_workers=1, use_cache=True):
         script_dir = Path(__file__).parent
         self.data_dir = script_dir.parent / data_dir
         if not self.data_dir.exists():
             self.data_dir.mkdir(parents=True, exist_ok=True)
+        # Processes used to parse files of a date range (None: one per core, 1: no pool)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Reuse parsed .npy copies of the CSVs for the columnar loaders
+        self.use_cache = use_cache
+        self._partition_index = None
+    
+    def map_files(self, reader, files, *file_args):
+        """Yield reader(path, *args) for each file in order, in a process pool when configured.
+        
+        reader must be a module-level function; file_args are per-file argument lists.
+        At most MAX_IN_FLIGHT files per worker are queued at a time, so a slow
+        consumer does not pile up parsed results.
+        """
+        paths = [self.data_dir / filename for filename in files]
+        if self.max_workers <= 1 or len(paths) <= 1:
+            yield from map(reader, paths, *file_args)
+            return
+        
+        workers = min(self.max_workers, len(paths))
+        executor = ProcessPoolExecutor(max_workers=workers)
+        jobs = zip(paths, *file_args)
+        pending = deque(executor.submit(reader, *job) for job in islice(jobs, MAX_IN_FLIGHT * workers))
+        try:
+            # Results in file order; they come back as pickled frames / arrays
+            while pending:
+                result = pending.popleft().result()
+                for job in islice(jobs, 1):
+                    pending.append(executor.submit(reader, *job))
+                yield result
+        finally:
+            # A consumer that stops early should not wait for files it will never read
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    
+    def _map_tick_columns(self, files):
+        """Yield the TICK_DTYPE array (None if missing) of each file in order.
+        
+        Files with a current .npy cache are memory-mapped here; only the
+        others go through map_files to be parsed.
+        """
+        cached = [_load_cache(self.data_dir / filename) if self.use_cache and (self.data_dir / filename).exists() else None
+                  for filename in files]
+        parsed = self.map_files(partial(read_tick_columns, use_cache=self.use_cache),
+                                [filename for filename, columns in zip(files, cached) if columns is None])
+        try:
+            for columns in cached:
+                yield next(parsed) if columns is None else columns
+        finally:
+            parsed.close()
     
     def read_csv(self, filename):
-        file_path = self.data_dir / filename
-        return pd.read_csv(file_path) if file_path.exists() else None
+        return _read_csv_file(self.data_dir / filename)
+    
+    def partition_index(self):
+        """PartitionIndex of data_dir, refreshed against each file's size and mtime"""
+        self._partition_index = PartitionIndex.load_or_build(
+            self.data_dir, self.data_dir / CACHE_DIR_NAME, self.data_dir / STORE_DIR_NAME, self._partition_index)
+        return self._partition_index
+    
+    def _record_parsed(self, filename, columns):
+        if columns is None:
+            return
+        index = self._partition_index if self._partition_index is not None else self.partition_index()
+        index.record(filename, columns)
     
-    def get_files_by_date_range(self, start_date, end_date, file_pattern="*"):
+    def get_files_by_date_range(self, start_date, end_date, file_pattern="*", symbol=None):
         start_dt = pd.to_datetime(start_date)
         end_dt = pd.to_datetime(end_date)
         
+        if '/' not in file_pattern and '\\' not in file_pattern and start_dt.tzinfo is None and end_dt.tzinfo is None:
+            entries = self.partition_index().lookup(start_dt.to_datetime64(), end_dt.to_datetime64(), symbol, file_pattern)
+            return sorted(entries['path'].tolist())
+        
         matching_files = []
         for file in self.data_dir.glob(file_pattern):
             if file.is_file():
-                date_match = re.search(r'(\d{4}[-_]\d{2}[-_]\d{2})', file.name)
-                if date_match:
-                    file_date_str = date_match.group(1).replace('_', '-')
-                    file_date = pd.to_datetime(file_date_str)
-                    if start_dt <= file_date <= end_dt:
-                        matching_files.append(file.name)
+                file_date = self.file_date(file.name)
+                if file_date is not None and start_dt <= file_date <= end_dt and (symbol is None or file.name.split('_')[0] == symbol):
+                    matching_files.append(file.name)
         
         return sorted(matching_files)
     
+    @staticmethod
+    def file_date(filename):
+        """Date in a file name such as BTCUSDT_2024-05-01.csv, or None"""
+        date_match = re.search(r'(\d{4}[-_]\d{2}[-_]\d{2})', filename)
+        return pd.to_datetime(date_match.group(1).replace('_', '-')) if date_match else None
+    
     def read_csv_by_date_range(self, start_date, end_date, file_pattern="*", aggregate=True):
         files = self.get_files_by_date_range(start_date, end_date, file_pattern)
         if not files:
             return None
         
-        dataframes = [self.read_csv(filename) for filename in files]
-        dataframes = [df for df in dataframes if df is not None]
+        dataframes = [df for df in self.map_files(_read_csv_file, files) if df is not None]
         
         if not dataframes:
             return None
         
         return pd.concat(dataframes, ignore_index=True) if aggregate else dataframes
     
+    def read_columns(self, filename):
+        """Load one CSV into a TICK_DTYPE array without building TickData objects"""
+        columns = read_tick_columns(self.data_dir / filename, self.use_cache)
+        self._record_parsed(filename, columns)
+        return columns
+    
+    def iterate_columns(self, start_date, end_date, file_pattern="*.csv"):
+        """Yield (filename, TICK_DTYPE array) per matching file, in date order"""
+        files = self.get_files_by_date_range(start_date, end_date, file_pattern)
+        for filename, columns in zip(files, self._map_tick_columns(files)):
+            if columns is not None:
+                self._record_parsed(filename, columns)
+                yield filename, columns
+    
+    def iterate_chunks(self, start_date, end_date, file_pattern="*.csv", chunk_size=CHUNK_SIZE):
+        """Yield TICK_DTYPE arrays of exactly chunk_size rows (the last may be shorter), in timestamp order.
+        
+        Files are read in date order and chunks span file boundaries. Each
+        file is sorted if needed (a cached file that is already sorted stays
+        memory-mapped), and ticks of a file that sort before the end of the
+        previous one are merged in. Files are read one ahead of the chunk
+        being yielded, so memory stays at about a file and a few chunks.
+        """
+        pending = []
+        pending_rows = 0
+        for ticks in _ordered_pieces(self._iterate_sorted_files(start_date, end_date, file_pattern)):
+            for start in range(0, len(ticks), chunk_size):
+                columns = np.array(ticks[start:start + chunk_size])
+                pending.append(columns)
+                pending_rows += len(columns)
+                if pending_rows < chunk_size:
+                    continue
+                joined = np.concatenate(pending) if len(pending) > 1 else pending[0]
+                for row in range(0, len(joined) - chunk_size + 1, chunk_size):
+                    yield joined[row:row + chunk_size]
+                tail = joined[len(joined) - len(joined) % chunk_size:]
+                pending, pending_rows = ([tail], len(tail)) if len(tail) else ([], 0)
+        if pending_rows:
+            yield np.concatenate(pending)
+    
+    def _iterate_sorted_files(self, start_date, end_date, file_pattern):
+        for filename in self.get_files_by_date_range(start_date, end_date, file_pattern):
+            columns = read_tick_columns(self.data_dir / filename, self.use_cache)
+            if columns is not None:
+                self._record_parsed(filename, columns)
+                yield _sort_ticks(columns)
+    
+    def read_columns_by_date_range(self, start_date, end_date, file_pattern="*.csv"):
+        """Load every matching file in the range into one TICK_DTYPE array"""
+        arrays = [columns for _, columns in self.iterate_columns(start_date, end_date, file_pattern)]
+        
+        if not arrays:
+            return None
+        
+        return np.concatenate(arrays)
+    
+    def read_range(self, start_ts, end_ts, file_pattern="*.csv"):
+        """Ticks with start_ts <= timestamp < end_ts from the memory-mapped tick store.
+        
+        Timestamps may be epoch-ns ints, datetimes or strings (naive = UTC).
+        Source files are added to the store on first use and rebuilt when they
+        change; after that a query is a few binary searches and a slice.
+        """
+        start_ns = timestamp_to_ns(pd.Timestamp(start_ts))
+        end_ns = timestamp_to_ns(pd.Timestamp(end_ts))
+        
+        # A daily file can hold ticks just past midnight, so include the day before
+        first_day = pd.Timestamp(start_ns).normalize() - pd.Timedelta(days=1)
+        files = self.get_files_by_date_range(first_day, pd.Timestamp(end_ns), file_pattern)
+        try:
+            store = TickStore(self.data_dir / STORE_DIR_NAME)
+            written = False
+            for filename in files:
+                file_path = self.data_dir / filename
+                stat = file_path.stat()
+                if store.is_current(filename, stat.st_size, stat.st_mtime_ns):
+                    continue
+                # The segment is the stored copy: reuse a .npy cache but do not write one
+                columns = _load_cache(file_path) if self.use_cache else None
+                if columns is None:
+                    columns = read_tick_columns(file_path, use_cache=False)
+                self._record_parsed(filename, columns)
+                store.write_segment(filename, columns, stat.st_size, stat.st_mtime_ns, save_manifest=False)
+                written = True
+            if written:
+                store.save_manifest()
+        except OSError:
+            # read-only data directory: filter the parsed files directly
+            return self._read_range_uncached(start_ns, end_ns, files)
+        
+        return store.read_range(start_ns, end_ns, files)
+    
+    def _read_range_uncached(self, start_ns, end_ns, files):
+        arrays = []
+        for filename, columns in zip(files, self._map_tick_columns(files)):
+            if columns is None:
+                continue
+            self._record_parsed(filename, columns)
+            timestamps = columns['timestamp']
+            arrays.append(columns[(timestamps >= start_ns) & (timestamps < end_ns)])
+        if not arrays:
+            return np.empty(0, dtype=TICK_DTYPE)
+        ticks = np.concatenate(arrays)
+        return ticks[np.argsort(ticks['timestamp'], kind='stable')]
+    
     def iterate_records(self, start_date, end_date, file_pattern="*.csv", limit=None):
         files = self.get_files_by_date_range(start_date, end_date, file_pattern)
         if not files:
             return
         
         record_count = 0
-        for filename in files:
-            df = self.read_csv(filename)
-            if df is not None:
-                for index, record in df.iterrows():
-                    try:
-                        symbol = filename.split('_')[0]
-                        timestamp_ms = record.get('timestamp', 0)
-                        timestamp = datetime.fromtimestamp(timestamp_ms / 1000)
-                        
-                        tick_data = TickData(
-                            symbol=symbol,
-                            side=str(record.get('side', '')),
-                            size=float(record.get('volume', 0)),
-                            price=float(record.get('price', 0)),
-                            timestamp=timestamp
-                        )
-                        
-                        yield {
-                            'filename': filename,
-                            'index': index,
-                            'tick_data': tick_data
-                        }
-                        
-                        record_count += 1
-                        if limit and record_count >= limit:
-                            return
-                            
-                    except (ValueError, TypeError):
-                        continue
+        for filename, df in zip(files, self.map_files(_read_csv_file, files)):
+            if df is None:
+                continue
+            symbol = filename.split('_')[0]
+            df = _coerce_columns(df)
+            # Whole column at once with integer arithmetic: ms -> UTC epoch-ns (no float seconds, no local timezone)
+            timestamps = df['timestamp'].to_numpy(dtype=np.int64) * 1_000_000
+            # One interned label per category rather than a string per row
+            sides = np.array([sys.intern(label) for label in df['side'].cat.categories], dtype=object)[df['side'].cat.codes.to_numpy()]
+            rows = zip(df.index, sides.tolist(), df['volume'].tolist(), df['price'].tolist(), timestamps.tolist())
+            for index, side, size, price, timestamp in rows:
+                yield {
+                    'filename': filename,
+                    'index': index,
+                    'tick_data': TickData(symbol=symbol, side=side, size=size, price=price, timestamp=timestamp)
+                }
+                
+                record_count += 1
+                if limit and record_count >= limit:
+                    return
 
 def main():
     data_reader = DataReader()
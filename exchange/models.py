@@ -1,13 +1,62 @@
+import sys
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+from typing import Iterator, List, Union
 
-@dataclass
+import numpy as np
+import pandas as pd
+
+# Side codes used by the columnar tick layout
+SIDE_SELL = -1
+SIDE_UNKNOWN = 0
+SIDE_BUY = 1
+
+class Side(IntEnum):
+    """Trade side, equal to the int8 SIDE_* codes"""
+    SELL = SIDE_SELL
+    UNKNOWN = SIDE_UNKNOWN
+    BUY = SIDE_BUY
+
+    @property
+    def label(self) -> str:
+        """Exchange label ('Buy', 'Sell', or '' when unknown)"""
+        return self.name.capitalize() if self is not Side.UNKNOWN else ''
+
+@dataclass(frozen=True, init=False)
 class TickData:
+    """One trade, stored compactly: slotted and immutable, with interned
+    symbol and side strings, a shared Side code and an epoch-ns timestamp.
+
+    side keeps the label the tick was created with ('Buy', 'sell', ...) and
+    side_code is its Side. The constructor takes the old arguments - a side
+    label and a datetime - as well as a Side and an epoch-ns int; timestamp
+    is still available as a naive UTC pd.Timestamp, like aggregator output.
+    """
+    __slots__ = ('symbol', 'side', 'side_code', 'size', 'price', 'timestamp_ns')
     symbol: str
     side: str
+    side_code: Side
     size: float
     price: float
-    timestamp: datetime 
+    timestamp_ns: int
+
+    def __init__(self, symbol: str, side, size: float, price: float, timestamp):
+        code = to_side(side)
+        object.__setattr__(self, 'symbol', sys.intern(str(symbol)))
+        object.__setattr__(self, 'side', code.label if isinstance(side, (int, np.integer)) else sys.intern(str(side)))
+        object.__setattr__(self, 'side_code', code)
+        object.__setattr__(self, 'size', float(size))
+        object.__setattr__(self, 'price', float(price))
+        object.__setattr__(self, 'timestamp_ns', timestamp_to_ns(timestamp))
+
+    def __reduce__(self):
+        # Frozen slots have no __dict__ to restore, so pickle through __init__
+        return TickData, (self.symbol, self.side, self.size, self.price, self.timestamp_ns)
+
+    @property
+    def timestamp(self) -> pd.Timestamp:
+        return pd.Timestamp(self.timestamp_ns)
 
 
 @dataclass
@@ -17,8 +66,136 @@ class TopBookL1:
     Aprice: float
     BSize: float
     ASize: float
-    timestamp: datetime 
+    timestamp: datetime
+
+# Columnar tick layout: epoch-ns timestamp, price, base-asset size, side code
+TICK_DTYPE = np.dtype([
+    ('timestamp', np.int64),
+    ('price', np.float64),
+    ('size', np.float64),
+    ('side', np.int8),
+])
+
+def side_code(side) -> int:
+    """Map a side label ('Buy', 'sell', ...) or Side to its int8 code"""
+    if isinstance(side, (int, np.integer)):
+        return int(side)
+    side = str(side).strip().lower()
+    if side == 'buy':
+        return SIDE_BUY
+    if side == 'sell':
+        return SIDE_SELL
+    return SIDE_UNKNOWN
+
+_SIDES = {code.value: code for code in Side}
+# Side of each label seen so far (exchanges use a handful)
+_LABEL_SIDES = {}
+
+def to_side(side) -> Side:
+    """Shared Side member for a label or code"""
+    if isinstance(side, Side):
+        return side
+    if isinstance(side, str):
+        code = _LABEL_SIDES.get(side)
+        if code is None:
+            code = _SIDES.get(side_code(side), Side.UNKNOWN)
+            if len(_LABEL_SIDES) < 256:
+                _LABEL_SIDES[side] = code
+        return code
+    return _SIDES.get(side_code(side), Side.UNKNOWN)
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+def timestamp_to_ns(timestamp) -> int:
+    """Convert one timestamp to epoch-ns; naive values are taken as UTC wall time.
+
+    Accepts epoch-ns ints, datetimes, and anything pd.Timestamp parses
+    (strings, np.datetime64, dates).
+    """
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    if isinstance(timestamp, datetime) and not isinstance(timestamp, pd.Timestamp):
+        epoch = _EPOCH_UTC if timestamp.tzinfo is not None else _EPOCH
+        return (timestamp - epoch) // _ONE_MICROSECOND * 1000
+    return pd.Timestamp(timestamp).value
+
+def ticks_to_array(ticks: Union[List[TickData], 'TickBatch']) -> np.ndarray:
+    """Pack TickData objects into a TICK_DTYPE structured array"""
+    if isinstance(ticks, TickBatch):
+        return ticks.data
+    array = np.empty(len(ticks), dtype=TICK_DTYPE)
+    if not ticks:
+        return array
+    array['timestamp'] = [t.timestamp_ns for t in ticks]
+    array['price'] = [t.price for t in ticks]
+    array['size'] = [t.size for t in ticks]
+    array['side'] = [t.side_code for t in ticks]
+    return array
+
+# Labels indexed by side code - SIDE_SELL
+_SIDE_LABELS = np.array([Side.SELL.label, Side.UNKNOWN.label, Side.BUY.label])
+
+class TickBatch:
+    """Ticks of one symbol held as a TICK_DTYPE array (25 bytes per tick).
+
+    timestamp_ns, price, size and side_code are NumPy views of the columns
+    (side gives the labels). Indexing with an int returns a TickData and
+    slicing returns a TickBatch view, so code written against TickData
+    lists keeps working.
+    """
+    __slots__ = ('symbol', 'data')
+
+    def __init__(self, data: np.ndarray, symbol: str = ''):
+        self.symbol = sys.intern(str(symbol))
+        self.data = np.asarray(data, dtype=TICK_DTYPE)
+
+    @classmethod
+    def from_ticks(cls, ticks: List[TickData]) -> 'TickBatch':
+        """Pack TickData objects, which must all share one symbol"""
+        symbols = {t.symbol for t in ticks}
+        if len(symbols) > 1:
+            raise ValueError(f"TickBatch holds one symbol, got {sorted(symbols)}")
+        return cls(ticks_to_array(ticks), symbols.pop() if symbols else '')
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, item) -> Union[TickData, 'TickBatch']:
+        if isinstance(item, (int, np.integer)):
+            row = self.data[item]
+            return TickData(self.symbol, int(row['side']), row['size'], row['price'], int(row['timestamp']))
+        return TickBatch(self.data[item], self.symbol)
+
+    def __iter__(self) -> Iterator[TickData]:
+        rows = zip(self.data['side'].tolist(), self.data['size'].tolist(), self.data['price'].tolist(), self.data['timestamp'].tolist())
+        for side, size, price, timestamp_ns in rows:
+            yield TickData(self.symbol, side, size, price, timestamp_ns)
+
+    @property
+    def timestamp_ns(self) -> np.ndarray:
+        return self.data['timestamp']
+
+    @property
+    def timestamp(self) -> pd.DatetimeIndex:
+        """Timestamps as a naive UTC DatetimeIndex"""
+        return pd.DatetimeIndex(self.timestamp_ns.view('datetime64[ns]'))
 
+    @property
+    def price(self) -> np.ndarray:
+        return self.data['price']
 
+    @property
+    def size(self) -> np.ndarray:
+        return self.data['size']
 
+    @property
+    def side_code(self) -> np.ndarray:
+        """int8 side codes (compare with SIDE_BUY / SIDE_SELL or Side members)"""
+        return self.data['side']
 
+    @property
+    def side(self) -> np.ndarray:
+        """Side labels ('Buy', 'Sell', '') built from the codes"""
+        return _SIDE_LABELS[self.data['side'] - SIDE_SELL]
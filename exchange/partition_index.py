@@ -0,0 +1,259 @@
+"""
+Partition Index - cached table of the daily files in a data directory
+"""
+
+import json
+import os
+import re
+import numpy as np
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import List, Optional
+
+# Name of the cached index inside the data directory's cache folder
+INDEX_FILE_NAME = 'partition_index.npz'
+
+DATE_PATTERN = re.compile(r'(\d{4}[-_]\d{2}[-_]\d{2})')
+
+def _entry_dtype(name_length: int, symbol_length: int) -> np.dtype:
+    return np.dtype([
+        ('symbol', f'U{max(symbol_length, 1)}'),
+        ('date', 'datetime64[D]'),
+        ('path', f'U{max(name_length, 1)}'),
+        ('size', np.int64),
+        ('mtime_ns', np.int64),
+        ('rows', np.int64),     # -1 until the file has been parsed
+        ('min_ts', np.int64),
+        ('max_ts', np.int64),
+    ])
+
+class PartitionIndex:
+    """Sorted (symbol, date) table of the dated files in one directory.
+
+    The directory is only listed again when its own mtime changes (a file
+    was added, removed or renamed); entries whose size and mtime are
+    unchanged keep their stats. Files rewritten in place are caught by
+    lookup(), which re-stats the entries it returns. The table is saved
+    under the cache folder when it changes. Range and symbol lookups are
+    binary searches and slices.
+
+    rows / min_ts / max_ts come from the tick store manifest, the .npy
+    cache or record() once the file has been parsed, and are -1 otherwise.
+    """
+
+    def __init__(self, entries: np.ndarray, data_dir: Optional[Path] = None, dir_mtime_ns: int = -1):
+        order = np.lexsort((entries['path'], entries['date'], entries['symbol']))
+        self.entries = entries[order]
+        # Directory the paths are relative to (None: lookups do not re-stat) and its mtime when listed
+        self.data_dir = data_dir
+        self.dir_mtime_ns = dir_mtime_ns
+        # False when the table differs from the saved copy
+        self.saved = True
+        # Row ranges of each symbol, and a date-ordered copy across all symbols
+        symbols, starts = np.unique(self.entries['symbol'], return_index=True)
+        ends = np.append(starts[1:], len(self.entries))
+        self._symbol_ranges = {symbol: (start, end) for symbol, start, end in zip(symbols.tolist(), starts.tolist(), ends.tolist())}
+        by_date = np.argsort(self.entries['date'], kind='stable')
+        self._by_date = self.entries[by_date]
+        self._dates = self.entries['date'].astype('datetime64[ns]')
+        self._sorted_dates = self._by_date['date'].astype('datetime64[ns]')
+        # path -> (row in entries, row in the date-ordered copy)
+        date_rows = np.empty(len(by_date), dtype=np.int64)
+        date_rows[by_date] = np.arange(len(by_date))
+        self._rows_by_path = dict(zip(self.entries['path'].tolist(), zip(range(len(self.entries)), date_rows.tolist())))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def load_or_build(cls, data_dir: Path, cache_dir: Path, store_dir: Optional[Path] = None,
+                      previous: Optional['PartitionIndex'] = None) -> 'PartitionIndex':
+        """Index of data_dir, starting from `previous` or the saved copy.
+
+        The directory is listed again only when its mtime differs from the
+        one recorded with the index.
+
+        Saving is skipped when the cache folder is not writable; the index
+        is then only kept in memory.
+        """
+        index_path = cache_dir / INDEX_FILE_NAME
+        if previous is None and index_path.exists():
+            try:
+                with np.load(index_path, allow_pickle=False) as saved:
+                    dir_mtime_ns = int(saved['dir_mtime_ns']) if 'dir_mtime_ns' in saved.files else -1
+                    previous = cls(saved['entries'], data_dir, dir_mtime_ns)
+            except (OSError, ValueError, KeyError):
+                previous = None
+
+        # Taken before listing, so a file added during the scan changes it again; the
+        # cache folder is created first because creating it changes the mtime too
+        try:
+            cache_dir.mkdir(exist_ok=True)
+        except OSError:
+            pass
+        try:
+            dir_mtime_ns = os.stat(data_dir).st_mtime_ns
+        except OSError:
+            dir_mtime_ns = -1
+        if previous is not None and dir_mtime_ns >= 0 and previous.dir_mtime_ns == dir_mtime_ns:
+            index = previous
+            index.data_dir = data_dir
+        else:
+            index = cls.build(data_dir, cache_dir, store_dir, previous, dir_mtime_ns)
+        if index.saved:
+            return index
+        try:
+            index.save(index_path)
+        except OSError:
+            pass  # read-only data directory: work from the in-memory index
+        return index
+
+    @classmethod
+    def build(cls, data_dir: Path, cache_dir: Path, store_dir: Optional[Path] = None,
+              previous: Optional['PartitionIndex'] = None, dir_mtime_ns: int = -1) -> 'PartitionIndex':
+        """Index from a directory listing; returns `previous` itself when no file changed"""
+        known = {}
+        if previous is not None:
+            entries = previous.entries
+            known = dict(zip(entries['path'].tolist(), zip(
+                entries['size'].tolist(), entries['mtime_ns'].tolist(),
+                entries['rows'].tolist(), entries['min_ts'].tolist(), entries['max_ts'].tolist())))
+        manifest = {}
+        if store_dir is not None and (store_dir / 'manifest.json').exists():
+            try:
+                with open(store_dir / 'manifest.json') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                manifest = {}
+        try:
+            cached = set(os.listdir(cache_dir))
+        except OSError:
+            cached = set()
+
+        rows = []
+        changed = previous is None
+        with os.scandir(data_dir) as it:
+            for item in it:
+                if item.name.startswith('.') or not item.is_file():
+                    continue
+                date_match = DATE_PATTERN.search(item.name)
+                if not date_match:
+                    continue
+                stat = item.stat()
+                old = known.get(item.name)
+                if old is not None and old[:2] == (stat.st_size, stat.st_mtime_ns):
+                    stats = old[2:]
+                else:
+                    stats = (-1, -1, -1)
+                    changed = True
+                if stats[0] < 0:
+                    stats = _known_stats(item.name, stat, cache_dir, cached, manifest)
+                    changed = changed or stats[0] >= 0
+                rows.append((item.name.split('_')[0], date_match.group(1).replace('_', '-'), item.name,
+                             stat.st_size, stat.st_mtime_ns) + tuple(stats))
+
+        if not changed and len(rows) == len(known):
+            index = previous
+            index.data_dir = data_dir
+        else:
+            dtype = _entry_dtype(max((len(row[2]) for row in rows), default=1), max((len(row[0]) for row in rows), default=1))
+            index = cls(np.array(rows, dtype=dtype), data_dir)
+        if index.dir_mtime_ns != dir_mtime_ns:
+            index.dir_mtime_ns = dir_mtime_ns
+            index.saved = False
+        return index
+
+    def save(self, index_path: Path):
+        temp_path = index_path.with_name(f"{index_path.name}.{os.getpid()}.tmp")
+        with open(temp_path, 'wb') as f:
+            np.savez(f, entries=self.entries, dir_mtime_ns=np.int64(self.dir_mtime_ns))
+        os.replace(temp_path, index_path)
+        self.saved = True
+
+    def record(self, name: str, ticks: np.ndarray):
+        """Fill in rows and time span of a file that has just been parsed"""
+        rows = self._rows_by_path.get(name)
+        if rows is None or self.entries['rows'][rows[0]] >= 0:
+            return
+        timestamps = ticks['timestamp']
+        self._update(name, rows=len(timestamps),
+                     min_ts=timestamps.min() if len(timestamps) else -1,
+                     max_ts=timestamps.max() if len(timestamps) else -1)
+
+    def rows(self, name: str) -> int:
+        """Parsed row count of a file, or -1 when it is not known (or the file is not indexed)"""
+        rows = self._rows_by_path.get(name)
+        return int(self.entries['rows'][rows[0]]) if rows is not None else -1
+
+    def lookup(self, start_date, end_date, symbol: Optional[str] = None, file_pattern: Optional[str] = None) -> np.ndarray:
+        """Entries with start_date <= date <= end_date (datetimes compared at ns), optionally for one symbol.
+
+        The result is a view of the table, re-statted so that files changed
+        since the listing come back with their stats dropped.
+        """
+        start = np.datetime64(start_date, 'ns')
+        end = np.datetime64(end_date, 'ns')
+        if symbol is not None:
+            start_row, end_row = self._symbol_ranges.get(symbol, (0, 0))
+            entries, dates = self.entries[start_row:end_row], self._dates[start_row:end_row]
+        else:
+            entries, dates = self._by_date, self._sorted_dates
+        entries = entries[np.searchsorted(dates, start, side='left'):np.searchsorted(dates, end, side='right')]
+        if file_pattern is not None and file_pattern != '*':
+            entries = entries[[fnmatchcase(str(path), file_pattern) for path in entries['path']]]
+        return self._restat(entries)
+
+    def _restat(self, entries: np.ndarray) -> np.ndarray:
+        """Refresh size and mtime of the given entries, dropping stats of changed files and leaving out missing ones"""
+        if self.data_dir is None or not len(entries):
+            return entries
+        data_dir = os.fspath(self.data_dir)
+        present = np.ones(len(entries), dtype=bool)
+        for i, (path, size, mtime_ns) in enumerate(zip(entries['path'].tolist(), entries['size'].tolist(), entries['mtime_ns'].tolist())):
+            try:
+                stat = os.stat(os.path.join(data_dir, path))
+            except OSError:
+                present[i] = False  # removed: the next listing drops it
+                continue
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                fields = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, rows=-1, min_ts=-1, max_ts=-1)
+                self._update(path, **fields)
+                # entries is a copy when file_pattern filtered it
+                for field, value in fields.items():
+                    entries[field][i] = value
+        return entries if present.all() else entries[present]
+
+    def _update(self, path: str, **fields):
+        row, date_row = self._rows_by_path[path]
+        for field, value in fields.items():
+            self.entries[field][row] = value
+            self._by_date[field][date_row] = value
+        self.saved = False
+
+    def split(self, entries: np.ndarray, parts: int) -> List[np.ndarray]:
+        """Cut date-ordered entries into up to `parts` contiguous groups of similar row count (size when unknown)"""
+        if len(entries) == 0:
+            return []
+        weights = np.where(entries['rows'] >= 0, entries['rows'], entries['size']).astype(np.float64)
+        cumulative = np.cumsum(weights)
+        cuts = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, parts) / parts, side='left') + 1
+        return [group for group in np.split(entries, np.unique(np.minimum(cuts, len(entries)))) if len(group)]
+
+def _known_stats(name: str, stat, cache_dir: Path, cached: set, manifest: dict):
+    """Rows and time span of an already-parsed file, from the tick store or the .npy cache"""
+    entry = manifest.get(name)
+    if entry is not None and entry['source_size'] == stat.st_size and entry['source_mtime_ns'] == stat.st_mtime_ns:
+        if entry['rows']:
+            return entry['rows'], entry['min_ts'], entry['max_ts']
+        return 0, -1, -1
+    cache_name = f"{name}.{stat.st_size}-{stat.st_mtime_ns}.npy"
+    if cache_name in cached:
+        cache_path = cache_dir / cache_name
+        try:
+            timestamps = np.load(cache_path, mmap_mode='r')['timestamp']
+        except (OSError, ValueError):
+            return -1, -1, -1
+        if len(timestamps):
+            return len(timestamps), int(timestamps.min()), int(timestamps.max())
+        return 0, -1, -1
+    return -1, -1, -1
@@ -0,0 +1,125 @@
+"""
+Tick Store - memory-mapped columnar tick segments with a sparse timestamp index
+"""
+
+import json
+import os
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from exchange.models import TICK_DTYPE
+
+# One sparse index entry (the segment's timestamp at that row) every INDEX_STRIDE rows
+INDEX_STRIDE = 65_536
+
+class TickStore:
+    """Directory of timestamp-sorted TICK_DTYPE segments (one per source file).
+
+    Each segment is a .npy file opened with mmap, plus a small .idx.npy
+    holding every INDEX_STRIDE-th timestamp. A range query finds the
+    overlapping segments and, inside each, the bounding index blocks by
+    binary search, so only a few pages are touched before slicing.
+    manifest.json records each segment's rows, time span and source
+    size/mtime so segments can be rebuilt when their source changes.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self.root / 'manifest.json'
+        self.manifest: Dict[str, Dict] = {}
+        if self._manifest_path.exists():
+            with open(self._manifest_path) as f:
+                self.manifest = json.load(f)
+
+    def is_current(self, name: str, size: int, mtime_ns: int) -> bool:
+        """True if the segment exists and was built from a source with this size and mtime"""
+        entry = self.manifest.get(name)
+        return entry is not None and entry['source_size'] == size and entry['source_mtime_ns'] == mtime_ns
+
+    def write_segment(self, name: str, ticks: np.ndarray, size: int = 0, mtime_ns: int = 0, save_manifest: bool = True):
+        """Store ticks as segment `name`, replacing any previous version.
+
+        When writing several segments, pass save_manifest=False and call
+        save_manifest() once after the last one.
+        """
+        ticks = np.asarray(ticks, dtype=TICK_DTYPE)
+        ticks = ticks[np.argsort(ticks['timestamp'], kind='stable')]
+        self._save(f"{name}.npy", ticks)
+        self._save(f"{name}.idx.npy", np.ascontiguousarray(ticks['timestamp'][::INDEX_STRIDE]))
+
+        self.manifest[name] = {
+            'rows': len(ticks),
+            'min_ts': int(ticks['timestamp'][0]) if len(ticks) else None,
+            'max_ts': int(ticks['timestamp'][-1]) if len(ticks) else None,
+            'source_size': size,
+            'source_mtime_ns': mtime_ns,
+        }
+        if save_manifest:
+            self.save_manifest()
+
+    def save_manifest(self):
+        temp_path = self._manifest_path.with_name(f"manifest.json.{os.getpid()}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(self.manifest, f)
+        os.replace(temp_path, self._manifest_path)
+
+    def _save(self, filename: str, array: np.ndarray):
+        temp_path = self.root / f"{filename}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, self.root / filename)
+
+    def segment(self, name: str) -> np.ndarray:
+        """Whole segment as a read-only memory map"""
+        return np.load(self.root / f"{name}.npy", mmap_mode='r')
+
+    def _row_bounds(self, name: str, start_ns: int, end_ns: int):
+        ticks = self.segment(name)
+        index = np.load(self.root / f"{name}.idx.npy")
+        timestamps = ticks['timestamp']
+
+        def position(ts):
+            # First row >= ts: the index narrows it to one block, then search inside the block
+            block = max(int(np.searchsorted(index, ts, side='left')) - 1, 0) * INDEX_STRIDE
+            return block + int(np.searchsorted(timestamps[block:block + INDEX_STRIDE + 1], ts, side='left'))
+
+        return ticks, position(start_ns), position(end_ns)
+
+    def read_range(self, start_ns: int, end_ns: int, names: Optional[List[str]] = None) -> np.ndarray:
+        """Ticks with start_ns <= timestamp < end_ns, in timestamp order.
+
+        A range inside one segment is returned as a zero-copy memory-mapped
+        slice; ranges spanning segments are concatenated.
+        """
+        candidates = sorted(
+            (entry['min_ts'], name) for name, entry in self.manifest.items()
+            if entry['rows'] and (names is None or name in names)
+        )
+        if not candidates:
+            return np.empty(0, dtype=TICK_DTYPE)
+        min_ts = np.array([ts for ts, _ in candidates], dtype=np.int64)
+        max_ts = np.maximum.accumulate([self.manifest[name]['max_ts'] for _, name in candidates])
+
+        # Segments sorted by start; running max of their ends keeps the lower bound searchable
+        first = int(np.searchsorted(max_ts, start_ns, side='left'))
+        last = int(np.searchsorted(min_ts, end_ns, side='left'))
+
+        slices = []
+        for _, name in candidates[first:last]:
+            if self.manifest[name]['max_ts'] < start_ns:
+                continue
+            ticks, row_start, row_end = self._row_bounds(name, start_ns, end_ns)
+            if row_end > row_start:
+                slices.append(ticks[row_start:row_end])
+
+        if not slices:
+            return np.empty(0, dtype=TICK_DTYPE)
+        if len(slices) == 1:
+            return slices[0]
+        merged = np.concatenate(slices)
+        # Overlapping segments (e.g. late ticks in the next day's file) need a merge sort
+        if np.any(np.diff(merged['timestamp']) < 0):
+            merged = merged[np.argsort(merged['timestamp'], kind='stable')]
+        return merged
@@ -9,15 +9,25 @@ from data_aggregator.delta_aggregator import DeltaAggregator
 from data_aggregator.volume_profile_aggregator import VolumeProfileAggregator
 from data_aggregator.volume_bucket_aggregator import VolumeBucketAggregator
 from data_aggregator.ohlcv_aggregator import OHLCVAggregator
+from data_aggregator.tick_buffer import TickBuffer
+from data_aggregator.bar_engine import TimeBars
+from data_aggregator.volume_bucket_aggregator import merge_volume_bucket_arrays
+from data_aggregator import partitioned
 
 class AggregationSystem:
-    def __init__(self, symbol: str = "BTCUSDT", start_date: str = "2024-05-01", end_date: str = "2024-05-04", limit: int = 10000000):
+    def __init__(self, symbol: str = "BTCUSDT", start_date: str = "2024-05-01", end_date: str = "2024-05-04", limit: int = 10000000,
+                 max_workers: int = 1):
         self.symbol = symbol
-        self.data_reader = DataReader("data")
-        self.ticks = []
+        # Daily files are parsed sequentially unless max_workers asks for a pool (None: one per core)
+        self.data_reader = DataReader("data", max_workers=max_workers)
+        self.ticks = TickBuffer()
         
-        for record_info in self.data_reader.iterate_records(start_date, end_date, "*.csv", limit=limit):
-            self.ticks.append(record_info['tick_data'])
+        # One columnar copy of the ticks, shared by reference with every aggregator
+        for filename, columns in self.data_reader.iterate_columns(start_date, end_date, "*.csv"):
+            remaining = limit - len(self.ticks) if limit else None
+            if remaining is not None and remaining <= 0:
+                break
+            self.ticks.extend(columns[:remaining])
     
     def export_to_csv(self, df: pd.DataFrame, filename: str):
         if df is not None and not df.empty:
@@ -27,9 +37,7 @@ class AggregationSystem:
         return None
     
     def export_delta(self, timeframe: str = "1h", filename: str = "delta_results.csv"):
-        delta_agg = DeltaAggregator(self.symbol)
-        for tick_data in self.ticks:
-            delta_agg.add_tick(tick_data)
+        delta_agg = DeltaAggregator(self.symbol, tick_buffer=self.ticks)
         
         deltas = delta_agg.generate_delta_by_timeframe(timeframe)
         if deltas:
@@ -38,9 +46,7 @@ class AggregationSystem:
         return None
     
     def export_volume_profile(self, timeframe: str = "1h", filename: str = "volume_profile_results.csv"):
-        vp_agg = VolumeProfileAggregator(self.symbol, price_bin_size=10.0)
-        for tick_data in self.ticks:
-            vp_agg.add_tick(tick_data)
+        vp_agg = VolumeProfileAggregator(self.symbol, price_bin_size=10.0, tick_buffer=self.ticks)
         
         vp_profiles = vp_agg.generate_profiles_by_timeframe(timeframe)
         if vp_profiles:
@@ -49,20 +55,16 @@ class AggregationSystem:
         return None
     
     def export_volume_buckets(self, bucket_size: float = 5000000.0, filename: str = "volume_buckets_results.csv"):
-        vb_agg = VolumeBucketAggregator(self.symbol)
-        for tick_data in self.ticks:
-            vb_agg.add_tick(tick_data)
+        vb_agg = VolumeBucketAggregator(self.symbol, tick_buffer=self.ticks)
         
-        buckets = vb_agg.generate_volume_buckets(bucket_size)
+        buckets = vb_agg.generate_volume_bucket_arrays(bucket_size)
         if buckets:
-            df = pd.DataFrame([{'timestamp': b.timestamp, 'open': b.open_price, 'high': b.high_price, 'low': b.low_price, 'close': b.close_price, 'total_volume': b.total_volume, 'net_flow': b.net_flow} for b in buckets])
+            df = pd.DataFrame({'timestamp': buckets['timestamp'], 'open': buckets['open_price'], 'high': buckets['high_price'], 'low': buckets['low_price'], 'close': buckets['close_price'], 'total_volume': buckets['total_volume'], 'net_flow': buckets['net_flow']})
             return self.export_to_csv(df, filename)
         return None
     
     def export_ohlcv(self, timeframe: str = "5min", filename: str = "ohlcv_results.csv"):
-        ohlcv_agg = OHLCVAggregator(self.symbol)
-        for tick_data in self.ticks:
-            ohlcv_agg.add_tick(tick_data)
+        ohlcv_agg = OHLCVAggregator(self.symbol, tick_buffer=self.ticks)
         
         ohlcv_data = ohlcv_agg.generate_ohlcv(timeframe)
         if ohlcv_data:
@@ -70,6 +72,88 @@ class AggregationSystem:
             return self.export_to_csv(df, filename)
         return None
 
+class PartitionedAggregationSystem(AggregationSystem):
+    """AggregationSystem that never holds the whole range in memory.
+    
+    Each export maps every daily file to a partial result in a worker process
+    (bars, profiles, volume bucket fragments) and reduces the partials, so peak
+    memory is about one day of ticks per worker. Periods are anchored at
+    midnight of the first file's date, like resample on the full range.
+    """
+    
+    def __init__(self, symbol: str = "BTCUSDT", start_date: str = "2024-05-01", end_date: str = "2024-05-04", limit: int = None,
+                 max_workers: int = None, use_cache: bool = True):
+        self.symbol = symbol
+        self.data_reader = DataReader("data", max_workers=max_workers, use_cache=use_cache)
+        self.files = self.data_reader.get_files_by_date_range(start_date, end_date, "*.csv")
+        self.ticks = None
+        
+        # Like AggregationSystem, limit keeps the first ticks in file order: whole files, then the head of one
+        self.row_limits = [None] * len(self.files)
+        if limit:
+            # Row counts come from the partition index; files it has not seen parsed are counted, up to the limit
+            index = self.data_reader.partition_index()
+            rows = []
+            for filename in self.files:
+                if sum(rows) >= limit:
+                    break
+                count = index.rows(filename)
+                rows.append(count if count >= 0 else partitioned.partition_rows(self.data_reader.data_dir / filename, use_cache))
+            kept = [(filename, rows) for filename, rows in zip(self.files, partitioned.row_limits(rows, limit)) if rows > 0]
+            self.files = [filename for filename, _ in kept]
+            self.row_limits = [rows for _, rows in kept]
+    
+    def _map(self, reader, *file_args):
+        """map_files over self.files, passing on the reader's use_cache setting and the row limits"""
+        return self.data_reader.map_files(reader, self.files, *file_args, self._each(self.data_reader.use_cache), self.row_limits)
+    
+    def _each(self, value) -> list:
+        return [value] * len(self.files)
+    
+    def _origin_ns(self) -> int:
+        return DataReader.file_date(self.files[0]).value
+    
+    def _reduce_bars(self, timeframe: str):
+        if not self.files:
+            return None
+        parts = [bars for bars in self._map(partitioned.partition_bars, self._each(timeframe), self._each(self._origin_ns())) if bars is not None]
+        return TimeBars.concatenate(parts) if parts else None
+    
+    def export_delta(self, timeframe: str = "1h", filename: str = "delta_results.csv"):
+        bars = self._reduce_bars(timeframe)
+        if bars is not None:
+            df = pd.DataFrame({'timestamp': bars.first_timestamps.astype('datetime64[ns]'), 'delta': bars.delta})
+            return self.export_to_csv(df, filename)
+        return None
+    
+    def export_volume_profile(self, timeframe: str = "1h", filename: str = "volume_profile_results.csv"):
+        if not self.files:
+            return None
+        parts = self._map(partitioned.partition_profiles, self._each(timeframe), self._each(10.0), self._each(self._origin_ns()))
+        profiles = partitioned.merge_profiles(list(parts))
+        vp_profiles = [profile.to_dict() for profile in profiles]
+        if vp_profiles:
+            df = pd.DataFrame([{'timestamp': p['timestamp'], 'total_volume': p['total_volume'], 'poc_price': p['poc']['price'], 'poc_volume': p['poc']['volume']} for p in vp_profiles])
+            return self.export_to_csv(df, filename)
+        return None
+    
+    def export_volume_buckets(self, bucket_size: float = 5000000.0, filename: str = "volume_buckets_results.csv"):
+        # Two passes: file volumes give each file's starting offset, then buckets split across files are joined
+        volumes = list(self._map(partitioned.partition_volume))
+        parts = self._map(partitioned.partition_volume_buckets, self._each(bucket_size), partitioned.volume_offsets(volumes))
+        buckets = merge_volume_bucket_arrays(list(parts))
+        if buckets:
+            df = pd.DataFrame({'timestamp': buckets['timestamp'], 'open': buckets['open_price'], 'high': buckets['high_price'], 'low': buckets['low_price'], 'close': buckets['close_price'], 'total_volume': buckets['total_volume'], 'net_flow': buckets['net_flow']})
+            return self.export_to_csv(df, filename)
+        return None
+    
+    def export_ohlcv(self, timeframe: str = "5min", filename: str = "ohlcv_results.csv"):
+        bars = self._reduce_bars(timeframe)
+        if bars is not None:
+            df = pd.DataFrame({'timestamp': bars.timestamps.astype('datetime64[ns]'), 'open': bars.open, 'high': bars.high, 'low': bars.low, 'close': bars.close, 'volume': bars.volume, 'trade_count': bars.trade_count})
+            return self.export_to_csv(df, filename)
+        return None
+
 def main():    
     agg_system = AggregationSystem("BTCUSDT")
     
@@ -0,0 +1,21 @@
+import sys
+import os
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exchange.models import TICK_DTYPE, SIDE_BUY, SIDE_SELL
+
+@pytest.fixture
+def ticks():
+    """Timestamp-ordered synthetic trades over about ten weeks, a few seconds apart"""
+    rng = np.random.default_rng(7)
+    n = 200_000
+    start_ns = np.datetime64('2024-04-03T09:30:00', 'ns').astype(np.int64)
+    array = np.empty(n, dtype=TICK_DTYPE)
+    array['timestamp'] = start_ns + np.cumsum(rng.integers(1, 60_000, n)) * 1_000_000
+    array['price'] = np.round(60_000 + np.cumsum(rng.normal(0, 5, n)), 1)
+    array['size'] = np.round(rng.exponential(0.05, n), 4) + 0.0001
+    array['side'] = np.where(rng.random(n) < 0.5, SIDE_BUY, SIDE_SELL)
+    return array
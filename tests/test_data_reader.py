@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import exchange.data_reader as data_reader
+from exchange.data_reader import DataReader
+
+@pytest.fixture
+def data_dir(tmp_path, ticks):
+    """Three daily CSVs in the raw exchange format, cut from the synthetic ticks"""
+    day_ns = 86_400 * 10**9
+    for day in range(3):
+        start = ticks['timestamp'][0] // day_ns * day_ns + day * day_ns
+        rows = ticks[(ticks['timestamp'] >= start) & (ticks['timestamp'] < start + day_ns)]
+        date = pd.Timestamp(start).strftime('%Y-%m-%d')
+        pd.DataFrame({
+            'timestamp': rows['timestamp'] // 1_000_000,
+            'price': rows['price'],
+            'volume': rows['size'],
+            'side': np.where(rows['side'] > 0, 'buy', 'sell'),
+        }).to_csv(tmp_path / f'BTCUSDT_{date}.csv', index=False)
+    return tmp_path
+
+def _expected(reader, start, end):
+    ticks = reader.read_columns_by_date_range('2000-01-01', '2100-01-01')
+    start_ns, end_ns = pd.Timestamp(start).value, pd.Timestamp(end).value
+    ticks = ticks[(ticks['timestamp'] >= start_ns) & (ticks['timestamp'] < end_ns)]
+    return ticks[np.argsort(ticks['timestamp'], kind='stable')]
+
+def test_read_range_builds_store_without_cache_copies(data_dir):
+    reader = DataReader(data_dir)
+    ticks = reader.read_range('2024-04-03 12:00', '2024-04-04 18:00')
+
+    assert not list((data_dir / '.cache').glob('*.csv.*.npy'))
+    assert np.array_equal(ticks, _expected(DataReader(data_dir, use_cache=False), '2024-04-03 12:00', '2024-04-04 18:00'))
+
+def test_read_range_without_store_falls_back_to_parsing(data_dir, monkeypatch):
+    def unwritable(root):
+        raise PermissionError(root)
+    monkeypatch.setattr(data_reader, 'TickStore', unwritable)
+    reader = DataReader(data_dir)
+    ticks = reader.read_range('2024-04-03 12:00', '2024-04-04 18:00')
+    assert len(ticks)
+    assert np.array_equal(ticks, _expected(reader, '2024-04-03 12:00', '2024-04-04 18:00'))
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_pool_reads_match_sequential(data_dir, use_cache):
+    sequential = DataReader(data_dir, use_cache=use_cache)
+    expected = [(name, np.array(columns)) for name, columns in sequential.iterate_columns('2000-01-01', '2100-01-01')]
+    pooled = DataReader(data_dir, max_workers=2, use_cache=use_cache)
+    for _ in range(2):  # second pass reads cached files in the parent
+        result = list(pooled.iterate_columns('2000-01-01', '2100-01-01'))
+        assert [name for name, _ in result] == [name for name, _ in expected]
+        assert all(np.array_equal(columns, other) for (_, columns), (_, other) in zip(result, expected))
+
+def test_iterate_chunks_in_timestamp_order(tmp_path, ticks):
+    """Shuffled rows inside a file and late ticks at the start of the next file"""
+    rng = np.random.default_rng(3)
+    day_ns = 86_400 * 10**9
+    parts = []
+    for day in range(3):
+        start = ticks['timestamp'][0] // day_ns * day_ns + day * day_ns
+        rows = ticks[(ticks['timestamp'] >= start - 600 * 10**9 * (day > 0)) & (ticks['timestamp'] < start + day_ns)]
+        rows = rows[rng.permutation(len(rows))] if day == 1 else rows
+        parts.append(rows)
+        pd.DataFrame({
+            'timestamp': rows['timestamp'] // 1_000_000,
+            'price': rows['price'],
+            'volume': rows['size'],
+            'side': np.where(rows['side'] > 0, 'buy', 'sell'),
+        }).to_csv(tmp_path / f"BTCUSDT_{pd.Timestamp(start).strftime('%Y-%m-%d')}.csv", index=False)
+    expected = np.concatenate(parts)['timestamp'] // 1_000_000 * 1_000_000
+    expected.sort()
+
+    for use_cache in [False, True, True]:  # parsed, then cache written, then memory-mapped
+        chunks = list(DataReader(tmp_path, use_cache=use_cache).iterate_chunks('2000-01-01', '2100-01-01', chunk_size=7_000))
+        assert all(len(chunk) == 7_000 for chunk in chunks[:-1])
+        assert np.array_equal(np.concatenate(chunks)['timestamp'], expected)
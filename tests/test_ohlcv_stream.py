@@ -0,0 +1,15 @@
+import pytest
+
+from data_aggregator.ohlcv_aggregator import OHLCVAggregator
+
+@pytest.mark.parametrize('timeframe', ['1min', '5min', '1h'])
+def test_streamed_candles_equal_batch(ticks, timeframe):
+    batch_agg = OHLCVAggregator("BTCUSDT")
+    batch_agg.add_tick_array(ticks)
+
+    stream_agg = OHLCVAggregator("BTCUSDT", stream_timeframes=[timeframe])
+    streamed = stream_agg.add_tick_array(ticks)[timeframe]
+    streamed += list(stream_agg.flush().values())
+
+    # Exact equality: both paths use the same Kahan summation in tick order
+    assert streamed == batch_agg.generate_ohlcv(timeframe)
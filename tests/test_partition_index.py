@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+from exchange.partition_index import PartitionIndex
+
+HEADER = 'timestamp,price,volume,side\n'
+
+def _write(path, rows, mtime_ns):
+    path.write_text(HEADER + ''.join(f'{ts},100.0,1.0,buy\n' for ts in rows))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def _index(data_dir, previous=None):
+    return PartitionIndex.load_or_build(data_dir, data_dir / '.cache', data_dir / '.store', previous)
+
+def test_lookup_by_date_and_symbol(tmp_path):
+    for day in range(1, 6):
+        for symbol in ['BTCUSDT', 'ETHUSDT']:
+            _write(tmp_path / f'{symbol}_2024-01-0{day}.csv', [1], 10**18)
+    index = _index(tmp_path)
+
+    entries = index.lookup(np.datetime64('2024-01-02'), np.datetime64('2024-01-03'))
+    assert entries['path'].tolist() == ['BTCUSDT_2024-01-02.csv', 'ETHUSDT_2024-01-02.csv',
+                                        'BTCUSDT_2024-01-03.csv', 'ETHUSDT_2024-01-03.csv']
+    entries = index.lookup(np.datetime64('2024-01-04'), np.datetime64('2024-01-31'), symbol='ETHUSDT')
+    assert entries['path'].tolist() == ['ETHUSDT_2024-01-04.csv', 'ETHUSDT_2024-01-05.csv']
+
+def test_refresh_after_added_and_rewritten_files(tmp_path):
+    _write(tmp_path / 'BTCUSDT_2024-01-01.csv', [1, 2, 3], 10**18)
+    index = _index(tmp_path)
+    index.record('BTCUSDT_2024-01-01.csv', np.array([(1,), (3,)], dtype=[('timestamp', np.int64)]))
+    assert index.lookup(np.datetime64('2024-01-01'), np.datetime64('2024-01-01'))['rows'].tolist() == [2]
+    assert index.rows('BTCUSDT_2024-01-01.csv') == 2
+    assert index.rows('ETHUSDT_2024-01-01.csv') == -1
+
+    # Rewritten in place: the directory mtime stays, the lookup re-stat drops the stats
+    dir_mtime_ns = os.stat(tmp_path).st_mtime_ns
+    _write(tmp_path / 'BTCUSDT_2024-01-01.csv', [1, 2, 3, 4], 2 * 10**18)
+    os.utime(tmp_path, ns=(dir_mtime_ns, dir_mtime_ns))
+    index = _index(tmp_path, index)
+    entries = index.lookup(np.datetime64('2024-01-01'), np.datetime64('2024-01-01'), file_pattern='BTC*')
+    assert entries['rows'].tolist() == [-1]
+    assert entries['mtime_ns'].tolist() == [2 * 10**18]
+
+    # Added file: the directory mtime changes and the next refresh lists it
+    _write(tmp_path / 'BTCUSDT_2024-01-02.csv', [5], 10**18)
+    index = _index(tmp_path, index)
+    assert len(index) == 2
+    assert len(_index(tmp_path)) == 2
@@ -0,0 +1,23 @@
+import pytest
+
+from data_aggregator.stats_aggregator import StatsAggregator
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_default_threshold_keeps_legacy_large_order_keys(ticks, streaming):
+    ticks = ticks.copy()
+    ticks['size'] *= 40  # a few hundred trades above $100k
+    agg = StatsAggregator("BTCUSDT", streaming=streaming)
+    agg.add_tick_array(ticks)
+    large_orders = agg.get_summary_stats()['large_orders']
+
+    assert large_orders['total_orders_above_100k'] > 0
+    assert large_orders['total_large_orders'] == large_orders['total_orders_above_100k']
+    assert large_orders['large_buy_volume'] == large_orders['buy_volume_above_100k']
+    assert large_orders['large_sell_volume'] == large_orders['sell_volume_above_100k']
+
+def test_other_thresholds_use_labelled_keys_only(ticks):
+    agg = StatsAggregator("BTCUSDT", large_order_thresholds=[1_000_000])
+    agg.add_tick_array(ticks)
+    assert set(agg.get_summary_stats()['large_orders']) == {
+        'buy_orders_above_1m', 'sell_orders_above_1m', 'total_orders_above_1m',
+        'buy_volume_above_1m', 'sell_volume_above_1m'}
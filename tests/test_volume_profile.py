@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_aggregator.volume_profile_aggregator import VolumeProfileAggregator
+from data_aggregator.bid_ask_profile_aggregator import BidAskProfileAggregator
+from data_aggregator.footprint_aggregator import FootprintAggregator
+
+def _resampled_volume(ticks, timeframe):
+    frame = pd.DataFrame({'volume': ticks['size'] * ticks['price']},
+                         index=pd.DatetimeIndex(ticks['timestamp'].view('datetime64[ns]')))
+    grouped = frame['volume'].resample(timeframe)
+    return grouped.sum()[grouped.count() > 0]
+
+@pytest.mark.parametrize('timeframe', ['1W', 'ME', '1D', '4h'])
+def test_profiles_follow_resample_periods(ticks, timeframe):
+    agg = VolumeProfileAggregator("BTCUSDT", price_bin_size=10.0)
+    agg.add_tick_array(ticks)
+    profiles = agg.generate_profiles_by_timeframe(timeframe)
+
+    expected = _resampled_volume(ticks, timeframe)
+    assert len(profiles) == len(expected)
+    assert np.allclose([p['total_volume'] for p in profiles], expected.to_numpy())
+
+    volume_profiles = agg.generate_volume_profiles(timeframe)
+    assert np.allclose([p.total_volume for p in volume_profiles], expected.to_numpy())
+
+@pytest.mark.parametrize('timeframe', ['1W', 'ME'])
+def test_calendar_timeframes_in_histogram_aggregators(ticks, timeframe):
+    expected = _resampled_volume(ticks, timeframe)
+
+    bid_ask = BidAskProfileAggregator("BTCUSDT", price_bin_size=10.0)
+    bid_ask.add_tick_array(ticks)
+    assert len(bid_ask.generate_bid_ask_profiles_by_timeframe(timeframe)) == len(expected)
+
+    footprint = FootprintAggregator("BTCUSDT", price_bin_size=10.0)
+    footprint.add_tick_array(ticks)
+    candles = footprint.generate_footprints(timeframe)
+    assert len(candles) == len(expected)
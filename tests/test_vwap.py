@@ -0,0 +1,17 @@
+import pytest
+
+from data_aggregator.vwap_aggregator import RollingVWAP
+
+@pytest.mark.parametrize('window', [{'time_window_ns': 0}, {'time_window_ns': -60}, {'volume_window': 0}, {'volume_window': -1.5}])
+def test_rolling_vwap_rejects_non_positive_windows(window):
+    with pytest.raises(ValueError):
+        RollingVWAP(**window)
+
+def test_rolling_volume_window_holds_exactly_the_window():
+    vwap = RollingVWAP(volume_window=3.0)
+    for i, (price, size) in enumerate([(10.0, 2.0), (20.0, 2.0), (30.0, 2.0)]):
+        vwap.update(i, price, size)
+    # The first tick is evicted and the second trimmed: 1 @ 20 and 2 @ 30
+    level = vwap.level([1.0])
+    assert level.volume == pytest.approx(3.0)
+    assert level.vwap == pytest.approx((20.0 + 2 * 30.0) / 3)
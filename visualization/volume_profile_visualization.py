@@ -11,9 +11,11 @@ import numpy as np
 def plot_classic_composite_profile(profiles: List[Dict[str, Any]], title: str, timeframe: str):
     """
     Plots multiple volume profiles side-by-side in the classic bar style.
+    Accepts profile dictionaries or VolumeProfile objects (e.g. stored hourly or composite profiles).
     """
     if not profiles:
         return
+    profiles = [p.to_dict() if hasattr(p, 'to_dict') else p for p in profiles]
 
     fig, ax = plt.subplots(figsize=(18, 10))
 